@@ -0,0 +1,186 @@
+"""
+    asyncio 介面 : 可直接在 async 服務中使用，不需自行以執行緒包裝
+
+    async with AsyncMediaExtractor(cookie_file) as extractor:
+        media_downloader = AsyncMediaDownloader(TwitterMediaDownloader(folder, TwitterVideoDownloader(None)))     # media_downloader.py
+        stats = await media_downloader.download_many(extractor.iter_media('https://x.com/xxx/media'), concurrency = 8)
+
+    - WebDriver 只能由同一執行緒操作 : 每個 AsyncMediaExtractor 擁有一個專屬執行緒，瀏覽器的建立、提取與關閉都在其中執行
+    - 下載在共用的執行緒池中執行，download_many() 以 Semaphore 限制同時下載的推文數 (可由多個帳號共用同一個 Semaphore)
+    - Selenium 在第一次啟動瀏覽器時才載入，只使用 AsyncMediaDownloader 時不需要安裝
+"""
+# 標準庫
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 自定義模組導入
+from twitter_video_downloader import TwitterVideoDownloader
+from metrics import get_metrics
+
+
+# 同步產生器結束的標記 (next() 的預設值)
+_DONE = object()
+
+
+class AsyncMediaExtractor():
+    """
+        TwitterMediaLinkExtractor 的 asyncio 版本
+
+        cookie_file     : 登入用的 cookie 檔案
+        driver_kwargs   : 傳給 start_driver() 的參數 (headless、profile_dir、debugger_address ...)
+        extractor_kwargs: 傳給 TwitterMediaLinkExtractor 的參數 (rate_limiter、image_size ...)
+    """
+    def __init__(self, cookie_file = None, driver_kwargs = None, extractor_kwargs = None, metrics = None):
+        self.cookie_file = cookie_file
+        self.driver_kwargs = dict(driver_kwargs or {})
+        self.extractor_kwargs = dict(extractor_kwargs or {})
+        self.metrics = metrics or get_metrics()
+
+        self.driver = None
+        self.extractor = None
+        self._executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'webdriver')
+        self._start_lock = asyncio.Lock()
+
+    async def _call(self, func, *args):
+        """在瀏覽器的專屬執行緒中執行"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _start(self):
+        from driver_factory import start_driver
+        from get_media_click import TwitterMediaLinkExtractor
+
+        self.driver = start_driver(self.cookie_file, **self.driver_kwargs)
+        self.extractor = TwitterMediaLinkExtractor(self.driver, metrics = self.metrics, **self.extractor_kwargs)
+
+    def _quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            finally:
+                self.driver = None
+                self.extractor = None
+
+    async def start(self):
+        async with self._start_lock:
+            if self.driver is None:
+                await self._call(self._start)
+        return self
+
+    async def restart(self):
+        """瀏覽器當機後重新啟動"""
+        async with self._start_lock:
+            try:
+                await self._call(self._quit)
+            except Exception:
+                pass
+            await self._call(self._start)
+
+    async def close(self):
+        await self._call(self._quit)
+        self._executor.shutdown(wait = True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def iter_media(self, account_url, mode = 'timeline', tweet_amount = 99999, tweet_store = Path("tweets.db"), seen_index = None, **kwargs):
+        """
+            async for tweet in extractor.iter_media(account_url) : 每解析出一則推文就產生其 TweetRecord
+            mode : 'timeline' (iter_media_content_from_timeline) / 'click' (iter_media_content)
+            提前結束 (break / aclose()) 時在瀏覽器執行緒中關閉產生器，寫入尚未儲存的推文
+            seen_index 只用於略過已處理的推文，由 TwitterMediaDownloader 在下載成功後記錄 (只提取時由呼叫端 add_status)
+        """
+        await self.start()
+        if mode == 'timeline':
+            iterator = self.extractor.iter_media_content_from_timeline(account_url, tweet_amount, tweet_store, seen_index = seen_index, **kwargs)
+        else:
+            iterator = self.extractor.iter_media_content(account_url, tweet_amount, tweet_store, seen_index = seen_index, **kwargs)
+
+        try:
+            while True:
+                tweet_content = await self._call(next, iterator, _DONE)
+                if tweet_content is _DONE:
+                    break
+                yield tweet_content
+        finally:
+            await self._call(iterator.close)
+
+    async def get_media(self, account_url, **kwargs):
+        return [tweet_content async for tweet_content in self.iter_media(account_url, **kwargs)]
+
+    async def get_m3u8_urls(self, tweet_url, timeout = 10):
+        """開啟推文頁面並擷取 .m3u8 網址 (TwitterVideoDownloader.parse_m3u8_urls)"""
+        await self.start()
+        video_downloader = TwitterVideoDownloader(self.driver, metrics = self.metrics)
+        return await self._call(video_downloader.parse_m3u8_urls, tweet_url, timeout)
+
+
+class AsyncMediaDownloader():
+    """
+        TwitterMediaDownloader / TwitterVideoDownloader 的 asyncio 版本
+
+        media_downloader : TwitterMediaDownloader，其 TwitterVideoDownloader 不需要 driver (影片的 .m3u8 由提取端取得)
+        executor         : 執行下載的執行緒池，多個帳號共用時傳入同一個
+    """
+    def __init__(self, media_downloader, executor = None, max_workers = 8):
+        self.media_downloader = media_downloader
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = 'download')
+
+    async def download(self, tweet_content):
+        """下載單則推文的媒體"""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.media_downloader.download, tweet_content)
+
+    async def download_video(self, tweet_url, m3u8_urls, folder):
+        video_downloader = self.media_downloader.tweet_video_downloader
+        await asyncio.get_running_loop().run_in_executor(self.executor, video_downloader.download, tweet_url, m3u8_urls, folder)
+
+    async def download_many(self, tweets, concurrency = 8, semaphore = None):
+        """
+            下載多則推文，tweets 可為 list 或 async iterator (例如 AsyncMediaExtractor.iter_media())
+            同時下載的推文數不超過 concurrency，傳入 semaphore 時改用其限制 (多個帳號共用全域上限)
+            下載跟不上時暫停讀取 tweets (提取端隨之等待)
+
+            回傳 {'downloaded', 'failed', 'failed_tweets'}
+        """
+        semaphore = semaphore or asyncio.Semaphore(concurrency)
+        stats = {'downloaded': 0, 'failed': 0, 'failed_tweets': []}
+        tasks = set()
+
+        async def download_one(tweet_content):
+            try:
+                await self.download(tweet_content)
+                stats['downloaded'] += 1
+            except Exception as e:
+                print(f"\033[91m[下載失敗] {tweet_content['url']} : {e}\033[0m")
+                stats['failed'] += 1
+                stats['failed_tweets'].append(tweet_content)
+            finally:
+                semaphore.release()
+
+        async def schedule(tweet_content):
+            await semaphore.acquire()
+            task = asyncio.create_task(download_one(tweet_content))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        try:
+            if hasattr(tweets, '__aiter__'):
+                async for tweet_content in tweets:
+                    await schedule(tweet_content)
+            else:
+                for tweet_content in tweets:
+                    await schedule(tweet_content)
+        finally:
+            # 提取端發生例外時仍等待已開始的下載完成
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        return stats
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown(wait = True)
@@ -0,0 +1,139 @@
+"""
+    批次下載 : 從帳號清單 (每行一個媒體頁面網址，# 開頭為註解) 提取並下載所有帳號的媒體
+
+    - --browsers             : 同時開啟的瀏覽器數 (同時提取的帳號數上限)
+    - --download-concurrency : 所有帳號合計同時下載的推文數上限
+    - 瀏覽器的排程、profile、重新啟動與重試由 worker_pool.ExtractionWorkerPool 處理 (最多 --max-attempts 次)
+
+    python batch_download.py accounts.txt --root-folder "../twitter post downloader/" --cookie-file ../twitter_auth_cookies.json --browsers 4 --download-concurrency 16
+"""
+# 標準庫
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 自定義模組導入
+from worker_pool import ExtractionWorkerPool, ExtractionJob, read_accounts
+from media_downloader import TwitterMediaDownloader
+from twitter_video_downloader import TwitterVideoDownloader
+from http_client import get_default_client
+from download_journal import DownloadJournal
+from seen_index import SeenIndex
+from blob_store import BlobStore
+from metrics import get_metrics
+
+
+class BatchDownloader(ExtractionWorkerPool):
+    """
+        ExtractionWorkerPool 的每個帳號在提取的同時下載媒體
+        - 所有帳號共用 : 連線池、內容定址儲存、下載執行緒池
+        - download_concurrency 為所有帳號合計同時下載的推文數，下載跟不上時提取端等待 (backpressure)
+        - 推文在媒體下載成功後才記錄於該帳號的 seen_index (TwitterMediaDownloader)，失敗或中斷的推文下次執行時重新提取
+    """
+    def __init__(self, root_folder, cookie_file, browsers = 2, download_concurrency = 16, extract_mode = 'timeline',
+                 max_attempts = 3, headless = True, min_interval = 5, metrics = None):
+        self.root_folder = Path(root_folder)
+        super().__init__(cookie_file, num_workers = browsers, min_interval = min_interval, max_attempts = max_attempts, headless = headless,
+                         extract_mode = extract_mode, profile_root = self.root_folder / '.chrome_profiles', metrics = metrics or get_metrics())
+        self.download_concurrency = download_concurrency
+
+        # 所有帳號共用 : 連線池、內容定址儲存、下載執行緒池
+        self.http_client = get_default_client()
+        self.blob_store = BlobStore(self.root_folder / '.blobs')
+        self.download_executor = ThreadPoolExecutor(max_workers = download_concurrency, thread_name_prefix = 'download')
+        self.download_slots = threading.BoundedSemaphore(download_concurrency)
+
+        self.stats = {'accounts': 0, 'tweets': 0, 'downloaded': 0, 'failed': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def process(self, driver, job):
+        tweet_media_folder = job.tweet_media_folder
+        journal = DownloadJournal(tweet_media_folder / '.download_journal.jsonl')
+        seen_index = SeenIndex(tweet_media_folder / '.seen_index.db')
+        video_downloader = TwitterVideoDownloader(None, http_client = self.http_client, stream_mode = True, journal = journal)
+        media_downloader = TwitterMediaDownloader(tweet_media_folder, video_downloader, http_client = self.http_client, journal = journal,
+                                                  seen_index = seen_index, blob_store = self.blob_store)
+
+        pending = set()
+
+        def download(tweet):
+            try:
+                media_downloader.download(tweet)
+                self._count('downloaded')
+            except Exception as e:
+                print(f"\033[91m[下載失敗] {tweet['url']} : {e}\033[0m")
+                self._count('failed')
+            finally:
+                self.download_slots.release()
+
+        def discard(future):
+            with self._lock:
+                pending.discard(future)
+
+        tweet_count = 0
+        try:
+            for tweet in self.iter_tweets(driver, job, seen_index):
+                tweet_count += 1
+                self._count('tweets')
+                self.download_slots.acquire()
+                future = self.download_executor.submit(download, tweet)
+                with self._lock:
+                    pending.add(future)
+                future.add_done_callback(discard)
+        finally:
+            # 瀏覽器錯誤時也等待已送出的下載完成，再關閉 seen_index
+            with self._lock:
+                unfinished = list(pending)
+            wait(unfinished)
+            seen_index.close()
+
+        self._count('accounts')
+        return tweet_count
+
+    def run(self, jobs):
+        try:
+            super().run(jobs)
+        finally:
+            self.download_executor.shutdown(wait = True)
+            self.blob_store.close()
+
+        return self.stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '批次下載多個帳號的媒體')
+    parser.add_argument('account_file', help = '帳號清單，每行一個媒體頁面網址 https://x.com/xxx/media')
+    parser.add_argument('--root-folder', default = '../twitter post downloader/')
+    parser.add_argument('--cookie-file', default = '../twitter_auth_cookies.json')
+    parser.add_argument('--mode', choices = ['timeline', 'click'], default = 'timeline')
+    parser.add_argument('--browsers', type = int, default = 2, help = '同時開啟的瀏覽器數')
+    parser.add_argument('--download-concurrency', type = int, default = 16, help = '所有帳號合計同時下載的推文數')
+    parser.add_argument('--tweet-amount', type = int, default = 99999, help = '每個帳號最多提取的推文數')
+    parser.add_argument('--max-attempts', type = int, default = 3)
+    parser.add_argument('--show', action = 'store_true', help = '顯示瀏覽器視窗')
+    parser.add_argument('--metrics-port', type = int, default = 9464)
+    args = parser.parse_args()
+
+    jobs = [ExtractionJob.for_account(target_url, args.root_folder, args.tweet_amount) for target_url in read_accounts(args.account_file)]
+    metrics = get_metrics()
+    metrics_server = metrics.start_http_server(port = args.metrics_port)
+    stop_metrics_export = metrics.start_jsonl_export(Path(args.root_folder) / '.metrics.jsonl', interval = 30)
+
+    batch = BatchDownloader(args.root_folder, args.cookie_file, browsers = args.browsers, download_concurrency = args.download_concurrency,
+                            extract_mode = args.mode, max_attempts = args.max_attempts, headless = not args.show, metrics = metrics)
+    start_time = time.time()
+    stats = batch.run(jobs)
+    elapsed = time.time() - start_time
+
+    print(f"帳號 : {stats['accounts']} / {len(jobs)}，推文 : {stats['tweets']}，下載 : {stats['downloaded']}，失敗 : {stats['failed']}")
+    print(f"每分鐘 {stats['tweets'] / elapsed * 60:.1f} 則")
+    for job in batch.failed_jobs:
+        print(f"\033[91m[提取失敗] {job.target_url}\033[0m")
+
+    stop_metrics_export()
+    metrics_server.shutdown()
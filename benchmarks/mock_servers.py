@@ -0,0 +1,145 @@
+"""
+    本機的 video.twimg.com / pbs.twimg.com 替身
+    提供合成的 HLS (fMP4) 播放清單、分段與圖片，可設定每個請求的延遲與頻寬
+"""
+# 標準庫
+import re
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockTwimgServer():
+    """
+        video.twimg.com :
+            /ext_tw_video/{video_id}/pu/pl/master.m3u8?tag=12            主播放清單 (三種畫質，各畫質的內容大小相同)
+            /ext_tw_video/{video_id}/pu/pl/avc1/1280x720/video.m3u8      影像播放清單
+            /ext_tw_video/{video_id}/pu/pl/mp4a/128000/audio.m3u8        音訊播放清單
+            /ext_tw_video/{video_id}/pu/vid/avc1/.../seg{i}.m4s          影像分段 (init.mp4 為初始化分段)
+            /ext_tw_video/{video_id}/pu/aud/mp4a/.../seg{i}.m4s          音訊分段
+        pbs.twimg.com :
+            /media/{name}.jpg                                            圖片
+
+        latency   : 每個請求回應前的等待秒數
+        bandwidth : 每個連線的傳輸速率 (bytes/s)，None 為不限制
+    """
+    def __init__(self, segments = 20, segment_size = 256 * 1024, audio_segment_size = 16 * 1024, image_size = 200 * 1024,
+                 latency = 0.02, bandwidth = None, chunk_size = 16 * 1024):
+        self.segments = segments
+        self.segment_size = segment_size
+        self.audio_segment_size = audio_segment_size
+        self.image_size = image_size
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.chunk_size = chunk_size
+
+        self.request_count = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def video_playlist_urls(self, video_id = '1000000000000000001'):
+        """主播放清單、影像與音訊的 .m3u8 網址 (對應 network log 中擷取到的網址)"""
+        return [
+            f"{self.base_url}/ext_tw_video/{video_id}/pu/pl/master.m3u8?tag=12",
+            f"{self.base_url}/ext_tw_video/{video_id}/pu/pl/avc1/1280x720/video.m3u8",
+            f"{self.base_url}/ext_tw_video/{video_id}/pu/pl/mp4a/128000/audio.m3u8",
+        ]
+
+    def image_urls(self, count = 4):
+        return [f"{self.base_url}/media/image{i}.jpg" for i in range(count)]
+
+    def master_playlist(self, video_id):
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-INDEPENDENT-SEGMENTS',
+            f'#EXT-X-MEDIA:NAME="Audio",TYPE=AUDIO,GROUP-ID="audio-128000",AUTOSELECT=YES,URI="/ext_tw_video/{video_id}/pu/pl/mp4a/128000/audio.m3u8"',
+        ]
+        for resolution, bandwidth in (('480x270', 288000), ('640x360', 832000), ('1280x720', 2176000)):
+            lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={resolution},CODECS="mp4a.40.2,avc1.640020",AUDIO="audio-128000"')
+            lines.append(f"/ext_tw_video/{video_id}/pu/pl/avc1/{resolution}/video.m3u8")
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def media_playlist(self, video_id, track, resolution):
+        if track == 'video':
+            prefix = f"/ext_tw_video/{video_id}/pu/vid/avc1"
+        else:
+            prefix = f"/ext_tw_video/{video_id}/pu/aud/mp4a"
+
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:6',
+            '#EXT-X-TARGETDURATION:3',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+            f'#EXT-X-MAP:URI="{prefix}/0/0/{resolution}/init.mp4"',
+        ]
+        for i in range(self.segments):
+            lines.append('#EXTINF:3.000,')
+            lines.append(f"{prefix}/{i * 3000}/{(i + 1) * 3000}/{resolution}/seg{i}.m4s")
+        lines.append('#EXT-X-ENDLIST')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def get_content(self, path):
+        matched = re.match(r'^/ext_tw_video/(\d+)/pu/pl/master\.m3u8$', path)
+        if matched:
+            return self.master_playlist(matched.group(1))
+
+        matched = re.match(r'^/ext_tw_video/(\d+)/pu/pl/(avc1|mp4a)/([^/]+)/', path)
+        if matched:
+            return self.media_playlist(matched.group(1), 'video' if matched.group(2) == 'avc1' else 'audio', matched.group(3))
+
+        if path.startswith('/ext_tw_video/'):
+            size = self.audio_segment_size if '/aud/' in path else self.segment_size
+            if path.endswith('init.mp4'):
+                size = 1024
+            return (path.encode('utf-8') * (size // len(path) + 1))[:size]
+
+        if path.startswith('/media/'):
+            return (path.encode('utf-8') * (self.image_size // len(path) + 1))[:self.image_size]
+
+        return None
+
+    def start(self):
+        mock_server = self
+
+        class MockHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(mock_server.latency)
+                content = mock_server.get_content(self.path.split('?')[0])
+                if content is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                for start in range(0, len(content), mock_server.chunk_size):
+                    chunk = content[start:start + mock_server.chunk_size]
+                    self.wfile.write(chunk)
+                    if mock_server.bandwidth:
+                        time.sleep(len(chunk) / mock_server.bandwidth)
+
+                with mock_server._lock:
+                    mock_server.request_count += 1
+                    mock_server.bytes_sent += len(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
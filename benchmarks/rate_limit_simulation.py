@@ -0,0 +1,107 @@
+"""
+    限流模擬 : 本機伺服器每秒最多接受 throttle_rate 個請求，超過則回傳 429
+    以 HTTPClient + AdaptiveRateLimiter 持續發送請求，比較實際成功的速率與伺服器的限流速率
+
+    python benchmarks/rate_limit_simulation.py --throttle-rate 40 --duration 10 --threads 8
+"""
+# 標準庫
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.error
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 自定義模組導入
+from http_client import HTTPClient
+from rate_limiter import AdaptiveRateLimiter, TokenBucket
+
+
+def start_throttled_server(throttle_rate, latency = 0.01):
+    server_bucket = TokenBucket(throttle_rate, capacity = max(1, throttle_rate / 10))
+    lock = threading.Lock()
+
+    class ThrottledHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                now = time.monotonic()
+                server_bucket._refill(now)
+                allowed = server_bucket.tokens >= 1
+                if allowed:
+                    server_bucket.tokens -= 1
+
+            body = b'ok' if allowed else b'too many requests'
+            self.send_response(200 if allowed else 429)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottledHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server
+
+
+def run_simulation(throttle_rate = 40, duration = 10, threads = 8, start_rate = 10, use_limiter = True):
+    server = start_throttled_server(throttle_rate)
+    url = f"http://127.0.0.1:{server.server_port}/segment.m4s"
+
+    rate_limiter = AdaptiveRateLimiter(rate = start_rate, max_rate = throttle_rate * 4, additive_increase = 0.5) if use_limiter else None
+    client = HTTPClient(pool_size = threads, rate_limiter = rate_limiter)
+
+    counts = {'ok': 0, 'throttled': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        while time.monotonic() < deadline:
+            try:
+                client.get(url)
+                key = 'ok'
+            except urllib.error.HTTPError:
+                key = 'throttled'
+            with lock:
+                counts[key] += 1
+
+    workers = [threading.Thread(target = worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    server.shutdown()
+
+    total = counts['ok'] + counts['throttled']
+    return {
+        'use_limiter'    : use_limiter,
+        'throttle_rate'  : throttle_rate,
+        'duration'       : duration,
+        'threads'        : threads,
+        'achieved_rate'  : round(counts['ok'] / duration, 2),
+        'efficiency'     : round(counts['ok'] / duration / throttle_rate, 3),
+        'throttled_ratio': round(counts['throttled'] / total, 3) if total else 0,
+        'final_rate'     : round(rate_limiter.get_rate('127.0.0.1'), 2) if rate_limiter else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '限流模擬')
+    parser.add_argument('--throttle-rate', type = float, default = 40)
+    parser.add_argument('--duration', type = float, default = 10)
+    parser.add_argument('--threads', type = int, default = 8)
+    parser.add_argument('--start-rate', type = float, default = 10)
+    args = parser.parse_args()
+
+    results = [
+        run_simulation(args.throttle_rate, args.duration, args.threads, args.start_rate, use_limiter = True),
+        run_simulation(args.throttle_rate, args.duration, args.threads, args.start_rate, use_limiter = False),
+    ]
+    print(json.dumps(results, indent = 2))
@@ -0,0 +1,70 @@
+"""
+    資源封鎖的效益 : 以點擊模式提取同一個媒體頁面兩次 (ResourceBlocker 開 / 關)，
+    比較瀏覽器傳輸的位元組數 (Network.loadingFinished 的 encodedDataLength)
+
+    兩次都關閉 create_driver() 的圖片/字型封鎖並允許自動播放，只比較 CDP Network.setBlockedURLs 的差異
+    需要 Chrome 與登入用的 cookie 檔案
+
+    python benchmarks/resource_blocking.py https://x.com/username/media --cookie-file ../twitter_auth_cookies.json --tweets 20
+"""
+# 標準庫
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 自定義模組導入
+from metrics import Metrics
+from driver_factory import start_driver
+from get_media_click import TwitterMediaLinkExtractor
+
+
+def run_extraction(url, cookie_file, tweet_amount, block_resources):
+    metrics = Metrics()
+    driver = start_driver(cookie_file, headless = True, block_images = False, block_fonts = False, block_autoplay = False)
+    try:
+        extractor = TwitterMediaLinkExtractor(driver, metrics = metrics, block_resources = block_resources)
+        with tempfile.TemporaryDirectory() as folder:
+            start_time = time.perf_counter()
+            tweets = list(extractor.iter_media_content(url, tweet_amount, tweet_store = Path(folder) / 'tweets.db'))
+            seconds = time.perf_counter() - start_time
+    finally:
+        driver.quit()
+
+    blocking = 'on' if block_resources else 'off'
+    total_bytes = metrics.get_counter('browser_bytes_total', blocking = blocking)
+    return {
+        'block_resources'  : block_resources,
+        'tweets'           : len(tweets),
+        'seconds'          : round(seconds, 2),
+        'browser_bytes'    : int(total_bytes),
+        'bytes_per_tweet'  : round(total_bytes / len(tweets)) if tweets else None,
+        'blocked_requests' : int(metrics.get_counter('browser_blocked_requests_total')),
+        'm3u8_found'       : sum(1 for tweet in tweets if tweet['media_type'] == 'video' and tweet['media_links']),
+        'videos'           : sum(1 for tweet in tweets if tweet['media_type'] == 'video'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '資源封鎖的效益')
+    parser.add_argument('url', help = '媒體頁面，例如 https://x.com/username/media')
+    parser.add_argument('--cookie-file', required = True)
+    parser.add_argument('--tweets', type = int, default = 20)
+    args = parser.parse_args()
+
+    results = [
+        run_extraction(args.url, args.cookie_file, args.tweets, block_resources = False),
+        run_extraction(args.url, args.cookie_file, args.tweets, block_resources = True),
+    ]
+    unblocked, blocked = results
+    if unblocked['bytes_per_tweet'] and blocked['bytes_per_tweet']:
+        saved = unblocked['bytes_per_tweet'] - blocked['bytes_per_tweet']
+        results.append({
+            'bytes_saved_per_tweet': saved,
+            'saved_ratio'          : round(saved / unblocked['bytes_per_tweet'], 3),
+        })
+    print(json.dumps(results, indent = 2))
@@ -0,0 +1,173 @@
+# 標準庫
+import os
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+
+
+class BlobStore():
+    """
+        內容定址的媒體儲存 : 檔案內容只保存一份於 blobs/{sha256[:2]}/{sha256}，
+        各推文的檔名 (twi@{username}_{time}_{status}_{idx}.jpg) 為指向 blob 的 hardlink
+
+        - media 表 : 媒體網址 (media key) -> sha256，已知的網址直接建立 hardlink，不發送任何請求
+        - blobs 表 : sha256 -> 大小，不同網址下載到相同內容時刪除新檔並改為 hardlink
+        - 下載時同時計算 sha256 (不需再讀一次檔案)，中斷的下載保留於 tmp/ 以 Range 續傳
+        - 空白或大小不符的內容不寫入索引 (拋出 ValueError)，大小與紀錄不符的 blob 視為遺失並重新下載
+        - evict() 移除內容錯誤的 blob，下次 fetch 時重新下載
+        - 不支援 hardlink 的檔案系統改為複製
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blob_folder = self.root / 'blobs'
+        self.tmp_folder = self.root / 'tmp'
+        self.blob_folder.mkdir(parents = True, exist_ok = True)
+        self.tmp_folder.mkdir(parents = True, exist_ok = True)
+
+        self._lock = threading.Lock()
+        # 同一個 key 同時只有一個執行緒下載 (依雜湊分配到固定數量的鎖)
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self.connection = sqlite3.connect(self.root / 'index.db', check_same_thread = False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                key    TEXT PRIMARY KEY,
+                sha256 TEXT
+            ) WITHOUT ROWID
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size   INTEGER
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+
+        self.stats = {'linked': 0, 'downloaded': 0, 'deduplicated': 0, 'rejected': 0, 'bytes_saved': 0}
+
+    def blob_path(self, sha256):
+        return self.blob_folder / sha256[:2] / sha256
+
+    def lookup(self, key):
+        """media key 對應的 sha256，blob 已遺失或大小與紀錄不符時回傳 None"""
+        with self._lock:
+            row = self.connection.execute('SELECT media.sha256, blobs.size FROM media JOIN blobs ON media.sha256 = blobs.sha256 '
+                                          'WHERE media.key = ?', (key,)).fetchone()
+        if row is None or not self._is_intact(*row):
+            return None
+        return row[0]
+
+    def _is_intact(self, sha256, size):
+        try:
+            return self.blob_path(sha256).stat().st_size == size
+        except FileNotFoundError:
+            return False
+
+    def _key_lock(self, key):
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def _count(self, key, value = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def link(self, sha256, filepath):
+        """將 filepath 指向 blob (hardlink，失敗時複製)"""
+        blob_path = self.blob_path(sha256)
+        filepath = Path(filepath)
+        if filepath.exists():
+            if os.path.samefile(blob_path, filepath):
+                return
+            filepath.unlink()
+
+        try:
+            os.link(blob_path, filepath)
+        except OSError:
+            shutil.copyfile(blob_path, filepath)
+
+    def fetch(self, key, filepath, http_client, url = None):
+        """
+            取得 key (預設即為媒體網址 url) 的內容並存放於 filepath，回傳 'linked' / 'deduplicated' / 'downloaded'
+            linked       : 網址已知，直接建立 hardlink (沒有請求)
+            deduplicated : 下載後發現內容與既有 blob 相同
+            downloaded   : 新的內容
+        """
+        url = url or key
+        with self._key_lock(key):
+            sha256 = self.lookup(key)
+            if sha256 is not None:
+                self.link(sha256, filepath)
+                self._count('linked')
+                self._count('bytes_saved', self.blob_path(sha256).stat().st_size)
+                return 'linked'
+
+            tmp_path = self.tmp_folder / hashlib.blake2b(key.encode('utf-8'), digest_size = 16).hexdigest()
+            hasher = hashlib.sha256()
+            size = http_client.download(url, tmp_path, resume = True, hasher = hasher)
+            sha256 = hasher.hexdigest()
+
+            # 空白的回應或寫入大小不符時不記錄網址，避免之後所有相同網址都連結到錯誤的內容
+            if size == 0 or tmp_path.stat().st_size != size:
+                tmp_path.unlink(missing_ok = True)
+                self._count('rejected')
+                raise ValueError(f"媒體內容不完整 ({size} bytes) : {url}")
+
+            blob_path = self.blob_path(sha256)
+            if self._is_intact(sha256, size):
+                tmp_path.unlink()
+                result = 'deduplicated'
+            else:
+                blob_path.parent.mkdir(exist_ok = True)
+                os.replace(tmp_path, blob_path)
+                result = 'downloaded'
+
+            with self._lock:
+                self.connection.execute('INSERT OR IGNORE INTO blobs (sha256, size) VALUES (?, ?)', (sha256, size))
+                self.connection.execute('INSERT OR REPLACE INTO media (key, sha256) VALUES (?, ?)', (key, sha256))
+                self.connection.commit()
+
+            self.link(sha256, filepath)
+            self._count(result)
+            if result == 'deduplicated':
+                self._count('bytes_saved', size)
+            return result
+
+    def evict(self, key):
+        """
+            移除 key 對應的 blob 與指向同一 blob 的所有網址 (內容錯誤時使用)，下次 fetch 時重新下載
+            已建立的推文檔案 (hardlink) 不會被刪除，回傳移除的網址數
+        """
+        with self._key_lock(key):
+            with self._lock:
+                row = self.connection.execute('SELECT sha256 FROM media WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return 0
+                sha256 = row[0]
+                removed = self.connection.execute('DELETE FROM media WHERE sha256 = ?', (sha256,)).rowcount
+                self.connection.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                self.connection.commit()
+
+            self.blob_path(sha256).unlink(missing_ok = True)
+            return removed
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '內容定址的媒體儲存')
+    parser.add_argument('root', help = 'BlobStore 資料夾，例如 "../twitter post downloader/.blobs"')
+    parser.add_argument('--evict', nargs = '+', metavar = 'URL', help = '移除內容錯誤的媒體，下次執行時重新下載')
+    args = parser.parse_args()
+
+    blob_store = BlobStore(args.root)
+    for url in args.evict or []:
+        removed = blob_store.evict(url)
+        if removed:
+            print(f"已移除 : {url} (共 {removed} 個網址)")
+        else:
+            print(f"\033[91m[找不到媒體] {url}\033[0m")
+    blob_store.close()
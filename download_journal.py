@@ -0,0 +1,72 @@
+# 標準庫
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+
+def file_sha256(filepath, chunk_size = 1024 * 1024):
+    """計算檔案的 sha256"""
+    hasher = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class DownloadJournal():
+    """
+        下載紀錄 (JSONL，只附加不改寫)
+        每完成一個檔案/分段寫入一行 {key, path, size, sha256}，重新執行時跳過已完成的項目
+    """
+    def __init__(self, journal_path):
+        self.journal_path = Path(journal_path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.journal_path.exists():
+            return
+
+        with open(self.journal_path, 'rb+') as f:
+            content = f.read()
+            # 中斷時可能留下寫到一半的最後一行 (沒有換行)，截斷後之後的紀錄才不會接在同一行
+            complete_size = content.rfind(b'\n') + 1
+            if complete_size < len(content):
+                f.truncate(complete_size)
+
+        for line in content[:complete_size].splitlines():
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            self.entries[entry['key']] = entry
+
+    def is_complete(self, key, filepath, verify = False):
+        """
+            檢查 key 是否已完整下載至 filepath (大小相符，verify = True 時另外比對 sha256)
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry['path'] != str(filepath):
+            return False
+
+        filepath = Path(filepath)
+        if not filepath.exists() or filepath.stat().st_size != entry['size']:
+            return False
+
+        if verify and entry.get('sha256'):
+            return file_sha256(filepath) == entry['sha256']
+
+        return True
+
+    def record(self, key, filepath, size, sha256 = None):
+        entry = {'key': key, 'path': str(filepath), 'size': size, 'sha256': sha256}
+        line = json.dumps(entry, ensure_ascii = False) + '\n'
+        with self._lock:
+            self.entries[key] = entry
+            with open(self.journal_path, 'a', encoding = 'utf-8') as f:
+                f.write(line)
@@ -0,0 +1,215 @@
+"""
+    瀏覽器 (WebDriver) 的建立與登入
+
+    - create_driver()     : Chrome / Edge 共用的設定，可使用固定的使用者資料夾 (profile_dir) 保留登入狀態，
+                            預設封鎖圖片、字型與媒體自動播放
+    - ensure_login()      : 以 CDP Network.setCookies 在載入任何頁面前設定 cookies，已登入時直接略過 (不需 x.com 首頁 + refresh)
+    - serve()             : 啟動常駐的瀏覽器 (remote debugging)，之後的執行以 create_driver(debugger_address = ...) 連接，省去啟動時間
+
+    python driver_factory.py serve --port 9222 --profile-dir ../chrome_profile --cookie-file ../twitter_auth_cookies.json
+"""
+# 標準庫
+import json
+import time
+import argparse
+from pathlib import Path
+
+# Selenium 相關導入
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.edge.options import Options as EdgeOptions
+
+# 自定義模組導入
+from metrics import get_metrics
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0'
+
+AUTH_COOKIE_NAME = 'auth_token'
+
+
+def create_driver(browser = 'chrome', headless = False, profile_dir = None, block_images = True, block_fonts = True,
+                  block_autoplay = True, debugger_address = None, remote_debugging_port = None, detach = False):
+    """
+        初始化瀏覽器設定並返回 WebDriver (driver)
+
+        profile_dir           : 使用者資料夾，cookies 與快取在下次啟動時沿用 (同一資料夾同時只能由一個瀏覽器使用)
+        block_images          : 不載入圖片 (元素的 src 仍在 DOM 中，不影響擷取網址)
+        block_fonts           : 不下載網頁字型
+        block_autoplay        : 影片需使用者操作才播放，點擊模式需要 .m3u8 請求時設為 False
+        debugger_address      : 連接已啟動的瀏覽器 (serve())，例如 '127.0.0.1:9222'，此時其他啟動參數無效
+        remote_debugging_port : 開放 remote debugging，供之後的執行連接
+        detach                : chromedriver 結束後瀏覽器繼續執行
+    """
+    options = EdgeOptions() if browser == 'edge' else ChromeOptions()
+
+    # 啟用 Network Logging
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    if debugger_address:
+        options.debugger_address = debugger_address
+        mode = 'attach'
+    else:
+        # 基本設定
+        options.add_argument(f'--user-agent={USER_AGENT}')
+        if headless:
+            options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--disable-extensions')
+        options.add_argument('--mute-audio')
+        options.add_argument("--window-size=1920x1080")
+        options.add_argument('--no-first-run')
+        options.add_argument('--no-default-browser-check')
+
+        if profile_dir:
+            options.add_argument(f'--user-data-dir={Path(profile_dir).resolve()}')
+        if remote_debugging_port:
+            options.add_argument(f'--remote-debugging-port={remote_debugging_port}')
+
+        # 封鎖不需要的資源
+        if block_images:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if block_fonts:
+            options.add_argument('--disable-remote-fonts')
+        if block_autoplay:
+            options.add_argument('--autoplay-policy=user-gesture-required')
+
+        # 隱藏不必要的終端機輸出
+        options.add_argument('--log-level=1')
+        options.add_experimental_option('excludeSwitches', ['enable-automation', 'enable-logging'])
+        if detach:
+            options.add_experimental_option('detach', True)
+        mode = 'launch'
+
+    with get_metrics().timer('driver_start', browser = browser, mode = mode):
+        if browser == 'edge':
+            return webdriver.Edge(options = options)
+        return webdriver.Chrome(options = options)
+
+
+def load_cookies(cookie_file):
+    with open(cookie_file, 'r') as f:
+        return json.load(f)
+
+
+def to_cdp_cookie(cookie):
+    """driver.get_cookies() 格式 -> CDP Network.CookieParam"""
+    cdp_cookie = {
+        'name'    : cookie['name'],
+        'value'   : cookie['value'],
+        'domain'  : cookie.get('domain', '.x.com'),
+        'path'    : cookie.get('path', '/'),
+        'secure'  : cookie.get('secure', True),
+        'httpOnly': cookie.get('httpOnly', False),
+    }
+    if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+        cdp_cookie['sameSite'] = cookie['sameSite']
+    if 'expiry' in cookie:
+        cdp_cookie['expires'] = cookie['expiry']
+    return cdp_cookie
+
+
+def get_browser_cookies(driver, url = 'https://x.com'):
+    return driver.execute_cdp_cmd('Network.getCookies', {'urls': [url]}).get('cookies', [])
+
+
+def is_logged_in(driver, cookies = None):
+    """
+        瀏覽器中已有未過期的 auth_token (不需載入頁面)
+        cookies 有值時另外確認與 cookie 檔案中的 auth_token 相同
+    """
+    expected = None
+    if cookies:
+        expected = next((cookie['value'] for cookie in cookies if cookie['name'] == AUTH_COOKIE_NAME), None)
+
+    for cookie in get_browser_cookies(driver):
+        if cookie['name'] != AUTH_COOKIE_NAME:
+            continue
+        # session cookie 的 expires 為 -1
+        if 0 < cookie.get('expires', -1) < time.time():
+            return False
+        return expected is None or cookie['value'] == expected
+    return False
+
+
+def cookie_login(driver, cookie_file):
+    """
+        使用cookie登入twitter(auth_token)
+    """
+    with get_metrics().timer('page_load', page = 'login'):
+        driver.get('https://x.com')
+
+    # 載入保存的 cookies
+    for cookie in load_cookies(cookie_file):
+        driver.add_cookie(cookie)
+
+    driver.refresh()
+
+    return driver
+
+
+def ensure_login(driver, cookie_file = None):
+    """
+        確保已登入，回傳使用的方式 ('cached' / 'cdp' / 'page'，沒有 cookie_file 且未登入時為 'none')
+        cached : profile 或常駐瀏覽器中已有有效的 auth_token，不做任何事
+        cdp    : 以 Network.setCookies 直接寫入 cookies，不載入頁面
+        page   : 瀏覽器不支援 CDP 時改用 cookie_login() (載入首頁 + refresh)
+    """
+    cookies = load_cookies(cookie_file) if cookie_file else None
+    with get_metrics().timer('login'):
+        try:
+            if is_logged_in(driver, cookies):
+                method = 'cached'
+            elif cookies:
+                driver.execute_cdp_cmd('Network.setCookies', {'cookies': [to_cdp_cookie(cookie) for cookie in cookies]})
+                method = 'cdp'
+            else:
+                method = 'none'
+        except AttributeError:
+            # 沒有 execute_cdp_cmd 的 driver (例如 Firefox / Remote)
+            if cookie_file:
+                cookie_login(driver, cookie_file)
+            method = 'page'
+
+    get_metrics().inc('login_total', method = method)
+    return method
+
+
+def start_driver(cookie_file = None, debugger_address = None, **kwargs):
+    """create_driver() + ensure_login()；debugger_address 有值時連接常駐瀏覽器"""
+    driver = create_driver(debugger_address = debugger_address, **kwargs)
+    ensure_login(driver, cookie_file)
+    return driver
+
+
+def serve(port = 9222, profile_dir = None, cookie_file = None, browser = 'chrome', headless = True, block_autoplay = True):
+    """
+        啟動常駐瀏覽器並登入，之後的執行以 create_driver(debugger_address = f'127.0.0.1:{port}') 連接
+        Ctrl+C 結束
+    """
+    driver = create_driver(browser = browser, headless = headless, profile_dir = profile_dir, block_autoplay = block_autoplay,
+                           remote_debugging_port = port, detach = True)
+    method = ensure_login(driver, cookie_file)
+    print(f"\033[92m瀏覽器已啟動 : 127.0.0.1:{port} (登入 : {method})\033[0m")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        driver.quit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '常駐瀏覽器')
+    parser.add_argument('command', choices = ['serve'])
+    parser.add_argument('--port', type = int, default = 9222)
+    parser.add_argument('--profile-dir', default = None)
+    parser.add_argument('--cookie-file', default = None)
+    parser.add_argument('--browser', choices = ['chrome', 'edge'], default = 'chrome')
+    parser.add_argument('--show', action = 'store_true', help = '顯示瀏覽器視窗')
+    parser.add_argument('--allow-autoplay', action = 'store_true', help = '允許影片自動播放 (點擊模式擷取 .m3u8 需要)')
+    args = parser.parse_args()
+
+    serve(args.port, args.profile_dir, args.cookie_file, args.browser, headless = not args.show, block_autoplay = not args.allow_autoplay)
@@ -2,73 +2,163 @@
 import time
 import random
 import logging
-import json
 import re
 from pathlib import Path
-from datetime import datetime, timezone
-import urllib.request
-
-# Pandas
-import pandas as pd
+from collections import OrderedDict
 
 # Selenium 相關導入
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options       
-# from selenium.webdriver.edge.options import Options  
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException
 
 # 自定義模組導入
 from twitter_video_downloader import TwitterVideoDownloader
+from http_client import get_default_client
+from download_journal import DownloadJournal
+from network_capture import NetworkCapture
+from timeline_parser import parse_timeline_response, resolve_image_url
+from pipeline import MediaPipeline
+from tweet_store import open_tweet_store, write_tweets_to_xlsx, EMPTY_TWEET_TIME
+from media_downloader import TwitterMediaDownloader
+from tweet_record import TweetRecord, parse_engagement, parse_tweet_url, write_records
+from seen_index import SeenIndex
+from rate_limiter import AdaptiveRateLimiter
+from metrics import get_metrics, BYTE_BUCKETS
+from blob_store import BlobStore
+from driver_factory import start_driver
+from resource_blocker import ResourceBlocker
+
+
+# 瀏覽器操作 (點開推文、捲動載入) 共用的限流主機名稱
+RATE_LIMIT_HOST = 'x.com'
+
+# media_links_cache 保留的推文數上限
+MEDIA_LINKS_CACHE_SIZE = 2048
+
+# 點開推文並一次取得所有欄位 (execute_async_script)
+# arguments : li_id, xpaths, timeout (秒), close_after (取得後直接關閉推文視窗，影片需等待 .m3u8 因此保持開啟), callback
+# 以 MutationObserver 等待推文視窗載入，不需要在 Python 端逐一 WebDriverWait
+EXTRACT_TWEET_SCRIPT = """
+const [liId, xpaths, timeout, closeAfter] = arguments;
+const done = arguments[arguments.length - 1];
+const deadline = Date.now() + timeout * 1000;
+
+function find(xpath, context) {
+    return document.evaluate(xpath, context || document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+
+function findAll(xpath, context) {
+    const result = document.evaluate(xpath, context || document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({length: result.snapshotLength}, (_, i) => result.snapshotItem(i));
+}
+
+// check() 回傳值為 truthy 時完成，逾時回傳 null
+function waitFor(check, timeoutMs) {
+    return new Promise(resolve => {
+        const value = check();
+        if (value) return resolve(value);
+
+        const observer = new MutationObserver(() => {
+            const value = check();
+            if (value) {
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(value);
+            }
+        });
+        observer.observe(document.body, {childList: true, subtree: true, attributes: true});
+        const timer = setTimeout(() => { observer.disconnect(); resolve(check() || null); }, Math.max(0, timeoutMs));
+    });
+}
+
+const remaining = () => deadline - Date.now();
+
+(async () => {
+    const li = await waitFor(() => find(xpaths.grid_item), remaining());
+    if (!li) return {error: 'grid_item'};
+
+    const mediaInfo = find(xpaths.media_info, li);
+    const mediaInfoText = mediaInfo ? mediaInfo.textContent : '';
+    const mediaType = mediaInfoText.includes(':') ? 'video' : (mediaInfoText === 'GIF' ? 'gif' : 'image');
+    const anchor = find(xpaths.media_atag, li);
+    if (!anchor) return {error: 'media_atag'};
+
+    li.scrollIntoView({block: 'center'});
+    anchor.click();
+
+    // 敏感內容需先點擊「查看貼文」
+    let expanded = false;
+    const mediaXPath = mediaType === 'video' ? xpaths.video : xpaths[mediaType];
+    const ready = await waitFor(() => {
+        if (!expanded) {
+            const expandButton = find(xpaths.expand_button);
+            if (expandButton) {
+                expandButton.click();
+                expanded = true;
+            }
+        }
+        const timeElement = find(xpaths.time);
+        const engagementElement = find(xpaths.engagement);
+        const mediaElement = find(mediaXPath);
+        if (!timeElement || !timeElement.getAttribute('datetime') || !engagementElement || !mediaElement) return null;
+        if (!mediaElement.getAttribute(mediaType === 'video' ? 'poster' : 'src')) return null;
+        return {timeElement, engagementElement};
+    }, remaining());
+    if (!ready) return {error: 'modal'};
+
+    const textElement = find(xpaths.text);
+    const videoElement = mediaType === 'video' ? find(xpaths.video) : null;
+    const result = {
+        url         : anchor.href,
+        media_type  : mediaType,
+        tweet_time  : ready.timeElement.getAttribute('datetime'),
+        engagement  : ready.engagementElement.getAttribute('aria-label') || '',
+        tweet_text  : textElement ? textElement.innerText : '',
+        media_links : mediaType === 'video' ? [] : findAll(mediaXPath).map(element => element.getAttribute('src')).filter(Boolean),
+        video_poster: videoElement ? videoElement.getAttribute('poster') : null,
+        closed      : false,
+    };
+
+    if (closeAfter && mediaType !== 'video') {
+        const closeButton = find(xpaths.close_button);
+        if (closeButton) {
+            closeButton.click();
+            result.closed = true;
+        }
+    }
+    return result;
+})().then(done, error => done({error: String(error)}));
+"""
 
-
-def create_driver():
-    """
-    初始化瀏覽器設定並返回 Chrome WebDriver (driver)
-    """
-    options = Options()
-    
-    # 基本設定
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0')
-    # options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--disable-extensions')
-    options.add_argument('--mute-audio')
-    options.add_argument("--window-size=1920x1080")
-    
-    # 啟用 Network Logging
-    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-    
-    # 隱藏不必要的終端機輸出
-    options.add_argument('--log-level=1')
-    options.add_experimental_option('excludeSwitches', ['enable-automation', 'enable-logging'])
-    
-    return webdriver.Chrome(options = options)
-    # return webdriver.Edge(options = options)
+CLOSE_TWEET_SCRIPT = """
+const closeButton = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (closeButton) closeButton.click();
+return closeButton !== null;
+"""
 
 
-def cookie_login(driver, cookie_file):
+class RecentSet():
     """
-        使用cookie登入twitter(auth_token)
+        只保留最近 maxsize 個項目的集合，記憶體用量不隨帳號的推文數增加
+        媒體格子 (虛擬列表) 與時間軸分頁的重複項目只出現在相鄰的項目之間
     """
-    driver.get('https://x.com')
-
-    # 載入保存的 cookies
-    with open(cookie_file, 'r') as f:
-        cookies = json.load(f)
-
-    for cookie in cookies:
-        driver.add_cookie(cookie)
+    def __init__(self, maxsize = 4096):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
 
-    driver.refresh()
+    def __contains__(self, item):
+        return item in self._items
 
-    return driver
+    def add(self, item):
+        self._items[item] = None
+        self._items.move_to_end(item)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last = False)
 
 
 class TwitterMediaLinkExtractor():
-    def __init__(self, driver):
+    def __init__(self, driver, rate_limiter = None, metrics = None, image_size = 'orig', block_resources = True):
         # xpath with './/' 相對路徑，從當前的element開始尋找
         # xpath with '//' 絕對路徑，從整個html文檔開始尋找
         self.MEDIA_ATAG_XPATH = ".//a[@class='css-175oi2r r-o7ynqc r-6416eg r-1ny4l3l r-1loqt21']"
@@ -85,9 +175,43 @@ class TwitterMediaLinkExtractor():
 
         self.MEDIA_AMOUNT_XPATH = "//div[@class='css-146c3p1 r-dnmrzs r-1udh08x r-3s2u2q r-bcqeeo r-1ttztb7 r-qvutc0 r-37j5jr r-n6v787 r-1cwl3u0 r-16dba41']"
 
+        self.CLOSE_BUTTON_XPATH = "//button[@aria-label='關閉']"
+        self.EXPAND_BUTTON_XPATH = "//button[@aria-label='查看貼文']"
+
         self.driver = driver
+        self.network_capture = NetworkCapture.for_driver(driver)
+        self.metrics = metrics or get_metrics()
+
+        # 取代固定的隨機等待 : 沒有被限流時逐步加快，失敗或變慢時降速
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate = 0.5, min_rate = 0.1, max_rate = 2, additive_increase = 0.05, 
+                                                                latency_target = 8)
         self.logger = logging.getLogger(__name__)
 
+        # execute_async_script 的逾時 (driver 設定，變更時才重新設定)
+        self._script_timeout = None
+
+        # 圖片網址的尺寸 (orig / large / medium / small)
+        self.image_size = image_size
+
+        # 媒體頁面載入的 GraphQL (UserMedia) 中每則推文的媒體連結 (status -> media_links)
+        # 點開推文時直接取得所有圖片網址，不需點擊輪播的「下一張投影片」
+        self.media_links_cache = OrderedDict()
+
+        # 封鎖 .m4s 分段、圖片與字型 (.m3u8 不受影響)，並記錄每則推文瀏覽器傳輸的位元組數
+        self.resource_blocker = ResourceBlocker.for_driver(driver) if block_resources else None
+        self._browser_bytes = self.network_capture.bytes_received
+        self._blocked_requests = self.network_capture.blocked_requests
+
+
+    def wait_for_element(self, step, xpath, timeout = 2):
+        """
+            WebDriverWait 等待 xpath 出現，耗時記錄於 webdriver_wait_seconds{step}
+            逾時記錄於 webdriver_wait_errors_total{step, error="TimeoutException"}
+        """
+        with self.metrics.timer('webdriver_wait', step = step):
+            return WebDriverWait(self.driver, timeout).until(
+                EC.presence_of_element_located((By.XPATH, xpath))
+            )
 
     def scroll_page(self, scroll_increment):
         script = """
@@ -99,180 +223,130 @@ class TwitterMediaLinkExtractor():
         return self.driver.execute_script(script, scroll_increment)
 
     def is_scroll_bottom(self):
-        # 獲取當前滾動位置
-        scrolled = self.driver.execute_script("return window.pageYOffset;")
-        # 獲取視窗高度
-        window_height = self.driver.execute_script("return window.innerHeight;")
-        # 獲取頁面總高度
-        total_height = self.driver.execute_script("return document.body.scrollHeight;")
+        # 一次取得當前滾動位置、視窗高度及頁面總高度
+        scrolled, window_height, total_height = self.driver.execute_script(
+            "return [window.pageYOffset, window.innerHeight, document.body.scrollHeight];"
+        )
 
         # 判斷是否已經滾動到底部
         return scrolled + window_height >= total_height
 
-    def click_next_image(self):
-        next_button_xpath = "//button[@aria-label='下一張投影片']"
-        try:
-            # 使用 WebDriverWait 等待按鈕出現
-            next_button = WebDriverWait(self.driver, 2).until(
-                EC.presence_of_element_located((By.XPATH, next_button_xpath))
-            )
-            next_button.click()
-            return True
-        
-        except TimeoutException:
-            return False
-        except NoSuchElementException:
-            return False
-        except:
-            return False
-        
+    def harvest_grid_items(self):
+        """
+            一次取得目前已渲染的媒體格子，回傳 ([(li_id, tweet_url), ...], 是否已滾動到底部)
+        """
+        script = """
+            let items = [];
+            document.querySelectorAll('li[id^="verticalGridItem-"]').forEach(li => {
+                let matched = li.id.match(/^verticalGridItem-(\\d+)-profile-grid-0$/);
+                let aTag = li.querySelector('a[href*="/status/"]');
+                if (matched && aTag) {
+                    items.push([parseInt(matched[1]), aTag.href]);
+                }
+            });
+            items.sort((a, b) => a[0] - b[0]);
+            let isBottom = window.pageYOffset + window.innerHeight >= document.body.scrollHeight;
+            return [items, isBottom];
+        """
+        return self.driver.execute_script(script)
+
+    def walk_media_grid(self, max_items, scroll_step = 1024, max_idle_scrolls = 5, render_wait = 0.3):
+        """
+            媒體格子是虛擬列表，只有畫面附近的項目存在於 DOM 中
+            逐步捲動並收集新出現的項目，依推文網址去除重複，依序產生 (li_id, tweet_url)
+            沒有新項目時加大捲動距離，到達 max_items 或捲到底部且連續 max_idle_scrolls 次沒有新項目時停止
+        """
+        seen_urls = RecentSet()
+        count = 0
+        idle_scrolls = 0
+        step = scroll_step
+        while count < max_items:
+            items, is_bottom = self.harvest_grid_items()
+
+            new_items = [(li_id, tweet_url) for li_id, tweet_url in items if tweet_url not in seen_urls]
+            for li_id, tweet_url in new_items:
+                seen_urls.add(tweet_url)
+                count += 1
+                yield li_id, tweet_url
+                if count >= max_items:
+                    return
+
+            if new_items:
+                idle_scrolls = 0
+                step = scroll_step
+            else:
+                idle_scrolls += 1
+                step = min(step * 2, scroll_step * 4)
+                if is_bottom and idle_scrolls >= max_idle_scrolls:
+                    return
+
+            self.scroll_page(step)
+            time.sleep(render_wait)
+
     def close_media(self):
-        close_button_xpath = "//button[@aria-label='關閉']"
+        close_button_xpath = self.CLOSE_BUTTON_XPATH
         while True:
             try:
-                close_button = WebDriverWait(self.driver, 2).until(
-                    EC.presence_of_element_located((By.XPATH, close_button_xpath))
-                )
+                close_button = self.wait_for_element('close_button', close_button_xpath)
                 close_button.click()
                 break
             except:
                 pass
 
-    def expand_media(self):
-        expand_button_xpath = "//button[@aria-label='查看貼文']"      
-        try:
-            # 使用 WebDriverWait 等待按鈕出現
-            expand_button = WebDriverWait(self.driver, 2).until(
-                EC.presence_of_element_located((By.XPATH, expand_button_xpath))
-            )
-            expand_button.click()
-        except:    
-            pass
-
-    def extract_engagement(self, text):
-        patterns = {
-            'reply'   : r'(\d+) 則回覆',
-            'retweet' : r'(\d+) 次轉發',
-            'like'    : r'(\d+) 個喜歡',
-            'bookmark': r'(\d+) 個書籤',
-            'view'    : r'(\d+) 次觀看'
-        }
-
-        engagement_dict = {key: 0 for key in patterns}
-
-        # 使用正則表達式填充 engagement 字典
-        for key, pattern in patterns.items():
-            matched = re.findall(pattern, text)
-            if matched:
-                engagement_dict[key] = int(matched[0])
-
-        return engagement_dict
-
-    def get_m3u8_urls(self, timeout = 5, poll_frequency = 1):
-        video_element = WebDriverWait(self.driver, 2).until(
-            EC.presence_of_element_located((By.XPATH, self.VIDEO_XPATH))
-        )        
-        video_poster = video_element.get_attribute('poster')
-        # poster = 
-        # https://pbs.twimg.com/ext_tw_video_thumb/1841962982311391232/pu/img/B6SJCE5HUvguxuhA.jpg
-        # https://pbs.twimg.com/ext_tw_video_thumb/1841962982311391232/img/B6SJCE5HUvguxuhA.jpg
-        # video_id = video_poster.split('/')[-3] 
+    def close_tweet(self):
+        """以單次 execute_script 關閉推文視窗，找不到關閉按鈕時改用 close_media() 等待"""
+        if not self.driver.execute_script(CLOSE_TWEET_SCRIPT, self.CLOSE_BUTTON_XPATH):
+            self.close_media()
 
+    def get_video_id(self, video_poster):
         match = re.search(r'/(\d+)/', video_poster)
-        video_id = match.group(1)
-
-        m3u8_urls = []
-        start_time = time.time()
-        while time.time() - start_time < timeout:            
-            # 獲取瀏覽器日誌
-            logs = self.driver.get_log('performance')
-            for log in logs:
-                message = json.loads(log['message'])['message']
-                try:
-                    response_url = message['params']['response']['url']
-                    if response_url.endswith('.m3u8') and video_id in response_url:
-                        m3u8_urls.append(response_url)
-                except KeyError:
-                    continue
-
-            if m3u8_urls:
-                break
+        return match.group(1)
 
-            # 等待一段時間後重新尋找
-            time.sleep(poll_frequency)
+    def update_media_links_cache(self):
+        """將新載入的 UserMedia 回應加入 media_links_cache"""
+        for _, body in self.network_capture.pop_response_bodies():
+            for tweet in parse_timeline_response(body, self.image_size):
+                self.media_links_cache[tweet.status] = tweet.media_links
 
-        return m3u8_urls
-
-    def get_engagement(self):
-        engagement_element = WebDriverWait(self.driver, 2).until(
-            EC.presence_of_element_located((By.XPATH, self.MEDIA_ENGAGEMENT_XPATH))
-        )
-        engagement_text = engagement_element.get_attribute('aria-label')
-        engagement = self.extract_engagement(engagement_text)
-
-        return engagement
-    
-    def get_time(self):
-        time_element = WebDriverWait(self.driver, 2).until(
-            EC.presence_of_element_located((By.XPATH, self.TWEET_TIME_XPATH))
-        )
-        tweet_time = time_element.get_attribute('datetime')
-
-        return tweet_time
-    
-    def get_text(self):
-        try:        
-            text_element = WebDriverWait(self.driver, 2).until(
-                EC.presence_of_element_located((By.XPATH, self.TEXT_XPATH))
-            )        
-            text = text_element.text
-        except:
-            return ""
-
-        return text
-    
-    def get_tweet_url(self):
-        a_tag_element = self.media_element.find_element(By.XPATH, self.MEDIA_ATAG_XPATH)
-        tweet_url = a_tag_element.get_attribute('href')
-        return tweet_url
-    
-
-    def get_media_type(self):
-        media_info_text = ''
-        try:            
-            media_info_element = self.media_element.find_element(By.XPATH, self.MEDIA_INFO_XPATH)
-            media_info_text = media_info_element.text
-        except NoSuchElementException:
-            media_info_text = ''
-
-        if ':' in media_info_text:
-            media_type = 'video'
-        elif media_info_text == 'GIF':
-            media_type = 'gif'
-        else:
-            media_type = 'image'
-        
-        return media_type
+        # 略過的推文 (seen_index) 不會被取出，只保留最近載入的部分
+        while len(self.media_links_cache) > MEDIA_LINKS_CACHE_SIZE:
+            self.media_links_cache.popitem(last = False)
 
+    def resolve_image_urls(self, status, image_urls):
+        """
+            推文的所有圖片網址 (image_size 尺寸)
+            優先使用 UserMedia 回應中的媒體資料 (包含輪播中尚未顯示的圖片)，沒有時改用推文視窗中已載入的 <img>
+        """
+        self.update_media_links_cache()
+        media_links = self.media_links_cache.pop(status, None)
+        if media_links:
+            self.metrics.inc('image_urls_resolved_total', source = 'timeline')
+            return media_links
 
-    def get_image_urls(self, media_type):      
-        media_link_list = []
-        while True:
-            is_clicked = self.click_next_image()
-            if not is_clicked:
-                img_tags = self.driver.find_elements(By.XPATH, self.IMAGE_XPATHS[media_type])
-                media_link_list = [img_tag.get_attribute('src') for img_tag in img_tags]                            
-                break
+        self.metrics.inc('image_urls_resolved_total', source = 'dom')
+        return [resolve_image_url(url, self.image_size) for url in image_urls]
 
-        return media_link_list
-    
-    def get_media_urls(self):        
-        if self.media_type == 'video':
-            media_link_list = self.get_m3u8_urls()
-        else:
-            media_link_list = self.get_image_urls(self.media_type)
+    def enable_resource_blocking(self):
+        if self.resource_blocker is not None:
+            self.resource_blocker.enable()
 
-        return media_link_list
+    def record_browser_bytes(self, tweet_count = 1):
+        """
+            記錄上次呼叫後瀏覽器傳輸的位元組數與被封鎖的請求數 (NetworkCapture)
+            tweet_count > 0 時另外記錄平均每則推文的位元組數 (browser_bytes_per_tweet)
+        """
+        self.network_capture.pump()
+        received = self.network_capture.bytes_received - self._browser_bytes
+        blocked = self.network_capture.blocked_requests - self._blocked_requests
+        self._browser_bytes += received
+        self._blocked_requests += blocked
+
+        blocking = 'on' if self.resource_blocker is not None else 'off'
+        self.metrics.inc('browser_bytes_total', received, blocking = blocking)
+        self.metrics.inc('browser_blocked_requests_total', blocked)
+        if tweet_count > 0:
+            for _ in range(tweet_count):
+                self.metrics.observe('browser_bytes_per_tweet', received / tweet_count, buckets = BYTE_BUCKETS, blocking = blocking)
 
     def get_media_amount(self):
         total_media_amount_element = self.driver.find_element(By.XPATH, self.MEDIA_AMOUNT_XPATH)
@@ -283,193 +357,256 @@ class TwitterMediaLinkExtractor():
 
         return total_media_amount
     
-    def get_clicked_media_content(self, li_id):
-        media_element_xpath = f'.//li[@id="verticalGridItem-{li_id}-profile-grid-0"]'
-        
-        # try:
-        # 獲取媒體元素
-        self.media_element = WebDriverWait(self.driver, 2).until(
-            EC.presence_of_element_located((By.XPATH, media_element_xpath))
-        )
-        self.media_type = self.get_media_type()
-
-        self.media_element.click()
-        self.expand_media()
-
-        self.tweet_url = self.get_tweet_url()                              
-        tweet_engagement = self.get_engagement()
-        tweet_time = self.get_time()
-        tweet_text = self.get_text()
-        tweet_media_links = self.get_media_urls()
-                                        
-        self.close_media()    
-
-        content_dict = {
-            'url'         : self.tweet_url,
-            'status'      : self.tweet_url.split('/')[-3],
-            'username'    : self.tweet_url.split('/')[-5], 
-            'tweet_time'  : tweet_time, 
-            'tweet_text'  : tweet_text,
-            'media_links' : tweet_media_links, 
-            'media_type'  : self.media_type,
-            'reply'       : int(tweet_engagement['reply']),
-            'retweet'     : int(tweet_engagement['retweet']),
-            'like'        : int(tweet_engagement['like']),
-            'bookmark'    : int(tweet_engagement['bookmark']),
-            'view'        : int(tweet_engagement['view']),
-            'created_time': datetime.now(timezone.utc).isoformat(timespec='seconds')
+    def get_clicked_media_content(self, li_id, timeout = 5):
+        """
+            點開推文並以單次 execute_async_script 取得所有欄位 (網址、時間、內文、互動數、媒體連結)
+            圖片/GIF 在同一次呼叫中關閉推文視窗；影片需等待 .m3u8 出現在 network log 後再關閉 (第二次呼叫)
+            圖片網址由 resolve_image_urls() 取得，圖片數量不影響耗時
+        """
+        if self._script_timeout != timeout:
+            self.driver.set_script_timeout(timeout + 2)
+            self._script_timeout = timeout
+
+        xpaths = {
+            'grid_item'    : f'.//li[@id="verticalGridItem-{li_id}-profile-grid-0"]',
+            'media_atag'   : self.MEDIA_ATAG_XPATH,
+            'media_info'   : self.MEDIA_INFO_XPATH,
+            'engagement'   : self.MEDIA_ENGAGEMENT_XPATH,
+            'time'         : self.TWEET_TIME_XPATH,
+            'text'         : self.TEXT_XPATH,
+            'video'        : self.VIDEO_XPATH,
+            'image'        : self.IMAGE_XPATHS['image'],
+            'gif'          : self.IMAGE_XPATHS['gif'],
+            'close_button' : self.CLOSE_BUTTON_XPATH,
+            'expand_button': self.EXPAND_BUTTON_XPATH,
         }
 
-        return content_dict
-
-    def get_media_content(self, url, tweet_amount = 1, tweet_excel_path = Path("tweets.xlsx"), log_batch_size = 5):
-        """獲取媒體頁面(media)上的圖片/影片推文內容"""
-        self.driver.get(url)
-        time.sleep(1)
-
-        # 
-        media_amount = self.get_media_amount()
-        if tweet_amount > media_amount:
-            tweet_amount = media_amount
-
-        # 獲取 Excel 中最近的推文時間
-        latest_tweet_time = "0000-00-00T00:00:00.000Z"    
-        if tweet_excel_path.exists():
-            df = pd.read_excel(tweet_excel_path)
-            # df['tweet_time'] = pd.to_datetime(df['tweet_time'])
-            sorted_df = df.sort_values(by = 'tweet_time', ascending = True)
-            latest_tweet_time = sorted_df.iloc[-1]['tweet_time']    
-            print(f"\033[92m上次獲取推文時間 : {latest_tweet_time}\033[0m")              
+        with self.metrics.timer('extract_script'):
+            result = self.driver.execute_async_script(EXTRACT_TWEET_SCRIPT, li_id, xpaths, timeout, True)
 
-        # 
-        count = 0
-        tweet_content_list = []
-        for li_id in range(tweet_amount):
-            try:
-                print(f"{li_id+1} / {tweet_amount}")
-                sleep_time = round(random.uniform(0, 2), 1)
-                time.sleep(sleep_time)
-                tweet_content_dict = self.get_clicked_media_content(li_id)
-                
-                if tweet_content_dict['tweet_time'] <= latest_tweet_time:
-                    print(f'\033[91m沒有最新的推文了，上次獲取推文時間 : {latest_tweet_time}\033[0m')
-                    break
-
-                tweet_content_list.append(tweet_content_dict)
+        if not result or 'error' in result:
+            step = result.get('error') if result else 'no_result'
+            self.metrics.inc('extract_script_failures_total', step = step)
+            if step != 'grid_item':
+                self.driver.execute_script(CLOSE_TWEET_SCRIPT, self.CLOSE_BUTTON_XPATH)
+            raise TimeoutException(f"推文載入逾時 ({step}) li_id : {li_id}")
 
-                
-                print(f"推文時間 : {tweet_content_dict['tweet_time'][:10]}")
-                print(f"推文連結 : {tweet_content_dict['url']}")
-                for i in range(len(tweet_content_dict['media_links'])):
-                    if i == 0:
-                        print(f"媒體連結 : {tweet_content_dict['media_links'][i]}")
-                    else:
-                        print(f"           {tweet_content_dict['media_links'][i]}")
+        tweet_url = result['url']
+        media_type = result['media_type']
+        tweet_media_links = result['media_links']
 
-                print('-'*150)      
+        if media_type == 'image':
+            tweet_media_links = self.resolve_image_urls(parse_tweet_url(tweet_url)[1], tweet_media_links)
+        elif media_type == 'video':
+            tweet_media_links = self.network_capture.wait_for_m3u8(self.get_video_id(result['video_poster']), timeout = timeout)
+        if not result['closed']:
+            self.close_tweet()
 
-                sleep_time = round(random.uniform(1, 3), 1)
-                time.sleep(sleep_time)
+        return TweetRecord.from_url(tweet_url, result['tweet_time'], result['tweet_text'], tweet_media_links, media_type,
+                                    parse_engagement(result['engagement']))
 
-                count += 1
-                if count % log_batch_size == 0:
-                    write_tweets_to_xlsx(tweet_content_list[count-log_batch_size:count], tweet_excel_path)
-            except:
-                # print(f"無法解析推文 li_id : {li_id}")
-                print(f'\033[91m[無法解析推文] li_id : {li_id}\033[0m')
-                pass
+    def persist_tweets(self, tweet_store, tweet_content_list):
+        """寫入推文 (不記錄於 seen_index : 媒體下載成功後才由 TwitterMediaDownloader 記錄)"""
+        tweet_store.append(tweet_content_list)
 
-        if count % log_batch_size:
-            write_tweets_to_xlsx(tweet_content_list[count - count % log_batch_size:count], tweet_excel_path)
+    def get_media_content(self, url, tweet_amount = 1, tweet_store = Path("tweets.db"), log_batch_size = 5, seen_index = None):
+        """
+            獲取媒體頁面(media)上的圖片/影片推文內容 (回傳所有推文的 list)
+            推文數量大時改用 iter_media_content()，已寫入 tweet_store 的推文不會留在記憶體中
+        """
+        tweet_content_list = list(self.iter_media_content(url, tweet_amount, tweet_store, log_batch_size, seen_index))
+        # 只提取不下載 : 已寫入 tweet_store 即視為處理完成
+        if seen_index is not None:
+            seen_index.add_status([tweet.status for tweet in tweet_content_list])
         return tweet_content_list
 
-        # if len(media_link_list) >= tweet_amount or self.is_scroll_bottom():                
-        #     break
+    def iter_media_content(self, url, tweet_amount = 1, tweet_store = Path("tweets.db"), log_batch_size = 5, 
+                           seen_index = None, stop_after_seen = 50):
+        """
+            逐一點開媒體頁面(media)上的推文，每解析完一則就產生其 TweetRecord
+            每 log_batch_size 則寫入一次 tweet_store，提前結束時寫入剩餘的推文
 
-        # # 執行滾動
-        # scroll_amount = str(int(random.uniform(512, 1024))) # random height
-        # self.scroll_page(scroll_amount) 
+            有 seen_index 時 : 點開前先以網址中的 status 檢查，已處理過的推文直接略過，
+            連續 stop_after_seen 則都已處理過才停止 (不受置頂或順序不一的推文影響)
+            seen_index 只用於檢查，推文由處理端 (下載成功的 TwitterMediaDownloader) 記錄，中斷時未下載的推文下次會重新提取
+            沒有 seen_index 時 : 遇到不晚於儲存中最近推文時間的推文即停止
+        """
+        self.network_capture.reset()
+        self.network_capture.watch_responses('/UserMedia')
+        self.media_links_cache.clear()
 
+        self.enable_resource_blocking()
+        with self.metrics.timer('page_load', page = 'media'):
+            self.driver.get(url)
+        time.sleep(1)
 
-def write_tweets_to_xlsx(tweet_content_list, tweet_excel_path = Path('tweet.xlsx')):
-    column_name = ['url', 'status', 'username', 'tweet_time', 'tweet_text', 'media_links', 
-                        'media_type', 'reply', 'retweet', 'like', 'bookmark', 'view', 'created_time']
-    
-    df = pd.DataFrame(tweet_content_list)
-    
-    # 確保所有列都存在，如果不存在則用NaN填充
-    for column in column_name:
-        if column not in df.columns:
-            df[column] = pd.NA
+        # 
+        media_amount = self.get_media_amount()
+        if tweet_amount > media_amount:
+            tweet_amount = media_amount
 
-    # 將多個媒體連結使用", "分開
-    df['media_links'] = df['media_links'].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
+        # 獲取儲存中最近的推文時間
+        tweet_store = open_tweet_store(tweet_store)
+        latest_tweet_time = get_latest_tweet_time(tweet_store) if seen_index is None else EMPTY_TWEET_TIME
 
-    if tweet_excel_path.exists():
-        with pd.ExcelWriter(tweet_excel_path, engine = 'openpyxl', mode = 'a', if_sheet_exists = 'overlay') as writer:
-            # 獲取現有的工作表
-            start_row = writer.book['Tweets'].max_row
+        # 
+        unwritten_list = []
+        seen_count = 0
+        try:
+            for index, (li_id, tweet_url) in enumerate(self.walk_media_grid(tweet_amount), 1):
+                if seen_index is not None:
+                    if seen_index.has_status(parse_tweet_url(tweet_url)[1]):
+                        seen_count += 1
+                        if seen_count >= stop_after_seen:
+                            print(f'\033[91m沒有最新的推文了，連續 {seen_count} 則推文已處理過\033[0m')
+                            break
+                        continue
+                    seen_count = 0
 
-            # 從最後一行之後開始寫入 Excel
-            df.to_excel(writer, startrow = start_row, index = False, header = False, sheet_name = 'Tweets')
-    else:
-        with pd.ExcelWriter(tweet_excel_path, engine = 'openpyxl') as writer:
-            df.to_excel(writer, index = False, sheet_name = 'Tweets')
+                try:
+                    print(f"{index} / {tweet_amount}")
+                    self.rate_limiter.acquire(RATE_LIMIT_HOST)
+                    start_time = time.monotonic()
+                    with self.metrics.timer('tweet_click'):
+                        tweet_record = self.get_clicked_media_content(li_id)
+                    self.rate_limiter.record(RATE_LIMIT_HOST, latency = time.monotonic() - start_time)
+                    self.record_browser_bytes()
+                except Exception:
+                    # print(f"無法解析推文 li_id : {li_id}")
+                    print(f'\033[91m[無法解析推文] li_id : {li_id}\033[0m')
+                    self.rate_limiter.record(RATE_LIMIT_HOST, error = True)
+                    continue
 
+                if tweet_record.tweet_time <= latest_tweet_time:
+                    print(f'\033[91m沒有最新的推文了，上次獲取推文時間 : {latest_tweet_time}\033[0m')
+                    break
 
-    print(f"\033[92m推文資料已成功寫入 {tweet_excel_path}\033[0m")
-    print('-'*150)
+                print_tweet_content(tweet_record)
+                unwritten_list.append(tweet_record)
+                if len(unwritten_list) >= log_batch_size:
+                    self.persist_tweets(tweet_store, unwritten_list)
+                    unwritten_list = []
 
+                yield tweet_record
+        finally:
+            if unwritten_list:
+                self.persist_tweets(tweet_store, unwritten_list)
 
-class TwitterMediaDownloader:
-    def __init__(self, tweet_media_folder, tweet_video_downloader):
-        self.tweet_media_folder = tweet_media_folder
-        self.tweet_video_downloader = tweet_video_downloader
+    def get_media_content_from_timeline(self, url, tweet_amount = 1, tweet_store = Path("tweets.db"), log_batch_size = 50, 
+                                        scroll_timeout = 10, seen_index = None):
+        """
+            獲取媒體頁面(media)上的推文內容，不逐一點開推文
+            直接解析頁面本身載入的 GraphQL (UserMedia) 回應，一次取得整頁推文的內文、互動數與媒體連結
+            影片的媒體連結為位元率最高的 mp4，GIF 為其 mp4
+        """
+        tweet_content_list = list(self.iter_media_content_from_timeline(url, tweet_amount, tweet_store, log_batch_size, scroll_timeout, seen_index))
+        if seen_index is not None:
+            seen_index.add_status([tweet.status for tweet in tweet_content_list])
+        return tweet_content_list
 
-    def download(self, tweet_content):
-        media_type  = tweet_content['media_type']
-        self.username    = tweet_content['username']
-        self.status      = tweet_content['status']
-        self.media_links = tweet_content['media_links']
-        self.tweet_time  = tweet_content['tweet_time']
+    def iter_media_content_from_timeline(self, url, tweet_amount = 1, tweet_store = Path("tweets.db"), log_batch_size = 50, 
+                                         scroll_timeout = 10, seen_index = None, stop_after_seen = 50):
+        """
+            get_media_content_from_timeline 的產生器版本，解析出一則推文就產生其 TweetRecord
+            seen_index / stop_after_seen 與 iter_media_content 相同
+        """
+        self.network_capture.reset()
+        self.network_capture.watch_responses('/UserMedia')
 
-        # 轉換時間 2024-10-03T09:39:17.000Z -> 2410030939
-        dt = datetime.strptime(self.tweet_time, "%Y-%m-%dT%H:%M:%S.%fZ")
-        self.tweet_time = dt.strftime("%y%m%d%H%M")
+        self.enable_resource_blocking()
+        with self.metrics.timer('page_load', page = 'media'):
+            self.driver.get(url)
+        time.sleep(1)
 
+        media_amount = self.get_media_amount()
+        if tweet_amount > media_amount:
+            tweet_amount = media_amount
 
-        download_methods = {
-            'image': self._download_image,
-            'video': self._download_video,
-            'gif': self._download_gif
-        }
+        tweet_store = open_tweet_store(tweet_store)
+        latest_tweet_time = get_latest_tweet_time(tweet_store) if seen_index is None else EMPTY_TWEET_TIME
 
-        if media_type in download_methods:
-            download_methods[media_type]()
+        seen_status = RecentSet()
+        seen_count = 0
+        count = 0
+        recorded_count = 0
+        unwritten_list = []
+        last_response_time = time.time()
+        try:
+            while count < tweet_amount:
+                bodies = self.network_capture.pop_response_bodies()
+                for tweet_record in (tweet for _, body in bodies for tweet in parse_timeline_response(body, self.image_size)):
+                    if tweet_record.status in seen_status:
+                        continue
+                    seen_status.add(tweet_record.status)
+
+                    if seen_index is not None:
+                        if seen_index.has_status(tweet_record.status):
+                            seen_count += 1
+                            if seen_count >= stop_after_seen:
+                                print(f'\033[91m沒有最新的推文了，連續 {seen_count} 則推文已處理過\033[0m')
+                                return
+                            continue
+                        seen_count = 0
+
+                    # 時間軸依時間排序 (置頂推文不在媒體頁面中)
+                    if tweet_record.tweet_time <= latest_tweet_time:
+                        print(f'\033[91m沒有最新的推文了，上次獲取推文時間 : {latest_tweet_time}\033[0m')
+                        return
+
+                    count += 1
+                    print(f"{count} / {tweet_amount}")
+                    print_tweet_content(tweet_record)
+                    unwritten_list.append(tweet_record)
+                    if len(unwritten_list) >= log_batch_size:
+                        self.persist_tweets(tweet_store, unwritten_list)
+                        unwritten_list = []
+
+                    yield tweet_record
+
+                    if count >= tweet_amount:
+                        return
+
+                if bodies:
+                    self.metrics.inc('timeline_pages_total')
+                    self.record_browser_bytes(count - recorded_count)
+                    recorded_count = count
+                    last_response_time = time.time()
+                    self.rate_limiter.record(RATE_LIMIT_HOST)
+                elif time.time() - last_response_time > scroll_timeout:
+                    # 捲動後一段時間沒有新的分頁，視為已到底
+                    return
+
+                # 捲動以載入下一頁
+                self.rate_limiter.acquire(RATE_LIMIT_HOST)
+                self.scroll_page(int(random.uniform(2048, 4096)))
+        finally:
+            if unwritten_list:
+                self.persist_tweets(tweet_store, unwritten_list)
+
+
+def get_latest_tweet_time(tweet_store):
+    """獲取儲存中最近的推文時間"""
+    latest_tweet_time = tweet_store.latest_tweet_time()
+    if latest_tweet_time != EMPTY_TWEET_TIME:
+        print(f"\033[92m上次獲取推文時間 : {latest_tweet_time}\033[0m")              
+
+    return latest_tweet_time
+
+
+def print_tweet_content(tweet_content_dict):
+    print(f"推文時間 : {tweet_content_dict['tweet_time'][:10]}")
+    print(f"推文連結 : {tweet_content_dict['url']}")
+    for i, media_link in enumerate(tweet_content_dict['media_links']):
+        if i == 0:
+            print(f"媒體連結 : {media_link}")
         else:
-            print(f"未定義的媒體類型：{media_type}")
-
-    def _download_image(self):
-        for idx, image_url in enumerate(self.media_links):
-            filename = f"twi@{self.username}_{self.tweet_time}_{self.status}_{idx + 1}.jpg"
-            self._download_file(image_url, filename)
-
-    def _download_video(self):
-        url = f"https://x.com/{self.username}/status/{self.status}"
-        self.tweet_video_downloader.download(url, m3u8_urls = self.media_links, folder = self.tweet_media_folder)
-
-    def _download_gif(self):
-        for idx, gif_url in enumerate(self.media_links):
-            filename = f"twi@{self.username}_{self.tweet_time}_{self.status}_{idx + 1}.mp4"
-            self._download_file(gif_url, filename)
-
-    def _download_file(self, url, filename):
-        urllib.request.urlretrieve(url, self.tweet_media_folder / filename)
-
+            print(f"           {media_link}")
 
+    print('-'*150)      
 
 
 if __name__=='__main__':
+    startup_time = time.perf_counter()
    
     # 設定目標URL和認證資訊
     target_url = "https://x.com/xxx/media"
@@ -481,29 +618,64 @@ if __name__=='__main__':
     # 設定輸出路徑
     root_folder = "../twitter post downloader/"
     tweet_media_folder = Path(root_folder) / Path(f"twi@{username}")
-    tweet_excel_path = tweet_media_folder / f'twi@{username}_tweets.xlsx'
+    tweet_store_path = tweet_media_folder / f'twi@{username}_tweets.db'
     
     # 確保輸出資料夾存在
     tweet_media_folder.mkdir(exist_ok = True)
     
-    # 初始化瀏覽器
-    driver = create_driver()
+    # 指標 : Prometheus 抓取 http://127.0.0.1:9464/metrics，並定期附加至 JSONL
+    metrics = get_metrics()
+    metrics_server = metrics.start_http_server(port = 9464)
+    stop_metrics_export = metrics.start_jsonl_export(tweet_media_folder / '.metrics.jsonl', interval = 30)
+
+    # 'timeline' : 解析頁面載入的 GraphQL 回應 (快速) / 'click' : 逐一點開推文
+    extract_mode = 'timeline'
+
+    # 初始化瀏覽器 : 固定的 profile 保留登入狀態，已登入時不需重新設定 cookies
+    # 若已執行 python driver_factory.py serve，可改為 start_driver(cookie_file, debugger_address = '127.0.0.1:9222') 省去啟動瀏覽器
     cookie_file = "../twitter_auth_cookies.json"
-    cookie_login(driver, cookie_file)
+    driver = start_driver(cookie_file, profile_dir = Path(root_folder) / '.chrome_profile',
+                          block_autoplay = extract_mode == 'timeline')     # 點擊模式需要影片載入 .m3u8
     
     # 初始化提取器和下載器
+    http_client      = get_default_client()
+    download_journal = DownloadJournal(tweet_media_folder / '.download_journal.jsonl')
     media_extractor  = TwitterMediaLinkExtractor(driver)
-    video_downloader = TwitterVideoDownloader(driver)
-    media_downloader = TwitterMediaDownloader(tweet_media_folder, video_downloader)
+    # 下載執行緒不可操作 driver (WebDriver 只能由提取端的執行緒使用)，.m3u8 由提取端取得，沒有 .m3u8 的推文記錄為失敗
+    video_downloader = TwitterVideoDownloader(None, http_client = http_client, stream_mode = True, journal = download_journal)
+    seen_index       = SeenIndex(tweet_media_folder / '.seen_index.db')
+    blob_store       = BlobStore(Path(root_folder) / '.blobs')     # 所有帳號共用
+    media_downloader = TwitterMediaDownloader(tweet_media_folder, video_downloader, http_client = http_client, journal = download_journal, 
+                                              seen_index = seen_index, blob_store = blob_store)
     
-    # 提取推文內容
-    tweet_content_list = media_extractor.get_media_content(target_url, tweet_amount = 99999, tweet_excel_path = tweet_excel_path)
-    
-    # 下載媒體
-    for index, tweet_content in enumerate(tweet_content_list, 1):
-        print(f"{index:3d} / {len(tweet_content_list):3d} : {tweet_content['url']}")
-        media_downloader.download(tweet_content)
+    # 提取推文內容，同時下載媒體
+    if extract_mode == 'timeline':
+        tweet_iterator = media_extractor.iter_media_content_from_timeline(target_url, tweet_amount = 99999, tweet_store = tweet_store_path, seen_index = seen_index)
+    else:
+        tweet_iterator = media_extractor.iter_media_content(target_url, tweet_amount = 99999, tweet_store = tweet_store_path, seen_index = seen_index)
+
+    pipeline = MediaPipeline(media_downloader, download_workers = 4)
+    pipeline_stats = pipeline.run(tweet_iterator)
+    print(f"提取 : {pipeline_stats['extracted']}，下載 : {pipeline_stats['downloaded']}，失敗 : {pipeline_stats['failed']}")
+
+    # 下載失敗的推文 (包含沒有擷取到 .m3u8 的影片) 不會記錄於 seen_index，下次執行時重新提取
+    # 圖片等不需要瀏覽器的媒體也可用 python manifest_download.py failed_tweets.jsonl 重新下載
+    if pipeline.failed_tweets:
+        failed_tweets_path = tweet_media_folder / 'failed_tweets.jsonl'
+        with open(failed_tweets_path, 'wb') as f:
+            write_records(pipeline.failed_tweets, f)
+        print(f"\033[91m失敗的推文已寫入 {failed_tweets_path}\033[0m")
+    if pipeline.first_tweet_time is not None:
+        time_to_first_tweet = pipeline.first_tweet_time - startup_time
+        metrics.observe('time_to_first_tweet_seconds', time_to_first_tweet, mode = extract_mode)
+        print(f"第一則推文 : {time_to_first_tweet:.2f} 秒")
+
+    stats = http_client.stats
+    print(f"HTTP 請求 : {stats['requests']}，新建連線 : {stats['connections_created']}，重複使用 : {stats['connections_reused']}")
+    print(f"重複媒體 : {blob_store.stats['linked'] + blob_store.stats['deduplicated']}，節省 : {blob_store.stats['bytes_saved'] / 1024 / 1024:.1f} MB")
     
     driver.quit()
+    stop_metrics_export()
+    metrics_server.shutdown()
 
         
@@ -0,0 +1,281 @@
+# 標準庫
+import io
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit
+
+
+# #EXT-X-STREAM-INF / #EXT-X-MEDIA 的屬性 : KEY=VALUE 或 KEY="VALUE"，以逗號分隔 (引號內可含逗號)
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+# video.twimg.com 的影片 id : /ext_tw_video/{id}/... 、/amplify_video/{id}/...
+VIDEO_ID_PATTERN = re.compile(r'/(?:ext_tw_video|amplify_video|tweet_video)/(\d+)/')
+
+# #EXT-X-MAP 中的 URI 屬性
+MAP_URI_PATTERN = re.compile(r'URI="([^"]*)"')
+
+# 媒體播放清單網址中的編碼與尺寸 : /pl/avc1/1280x720/xxx.m3u8 、/pl/mp4a/128000/xxx.m3u8
+MEDIA_PLAYLIST_PATTERN = re.compile(r'/pl/(avc1|hvc1|mp4a)/(?:(\d+)x(\d+)|(\d+))/')
+
+# 影像畫質的選擇方式
+VARIANT_POLICIES = ('best', 'max_resolution', 'max_bitrate', 'min_bitrate')
+
+
+def parse_attributes(text):
+    """'BANDWIDTH=2176000,RESOLUTION=1280x720,CODECS="mp4a.40.2,avc1.640020"' -> dict (去除引號)"""
+    return {key: value.strip('"') for key, value in ATTRIBUTE_PATTERN.findall(text)}
+
+
+def parse_resolution(text):
+    """'1280x720' -> (1280, 720)，格式不符時回傳 None"""
+    try:
+        width, height = text.lower().split('x')
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        return None
+
+
+def is_master_playlist(content):
+    return '#EXT-X-STREAM-INF' in content
+
+
+def get_video_id(url):
+    matched = VIDEO_ID_PATTERN.search(urlsplit(url).path)
+    return matched.group(1) if matched else None
+
+
+def classify_playlist_url(url):
+    """
+        由網址判斷播放清單類型 (不需下載)，回傳 (format, resolution, bitrate)
+        format 為 'video' / 'audio'，無法判斷時 (通常是主播放清單) 為 None
+    """
+    matched = MEDIA_PLAYLIST_PATTERN.search(urlsplit(url).path)
+    if not matched:
+        return None, None, None
+    codec, width, height, bitrate = matched.groups()
+    if codec == 'mp4a':
+        return 'audio', None, int(bitrate) if bitrate else None
+    return 'video', (int(width), int(height)) if width else None, None
+
+
+def parse_master_playlist(content, base_url):
+    """
+        解析主播放清單 (master playlist)，回傳
+        {
+            'variants' : [{'url', 'bandwidth', 'resolution', 'codecs', 'audio'}, ...],
+            'audio'    : {GROUP-ID: [{'url', 'group_id', 'name', 'default'}, ...]},
+        }
+        網址皆已轉為絕對網址
+    """
+    variants = []
+    audio_groups = {}
+    stream_info = None
+    for line in io.StringIO(content):
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            stream_info = parse_attributes(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-MEDIA:'):
+            attributes = parse_attributes(line.split(':', 1)[1])
+            if attributes.get('TYPE') != 'AUDIO' or 'URI' not in attributes:
+                continue
+            audio_groups.setdefault(attributes.get('GROUP-ID'), []).append({
+                'url'      : urljoin(base_url, attributes['URI']),
+                'group_id' : attributes.get('GROUP-ID'),
+                'name'     : attributes.get('NAME'),
+                'default'  : attributes.get('DEFAULT') == 'YES',
+            })
+        elif not line.startswith('#') and stream_info is not None:
+            variants.append({
+                'url'       : urljoin(base_url, line),
+                'bandwidth' : int(stream_info.get('BANDWIDTH', 0)),
+                'resolution': parse_resolution(stream_info.get('RESOLUTION')),
+                'codecs'    : stream_info.get('CODECS', ''),
+                'audio'     : stream_info.get('AUDIO'),
+            })
+            stream_info = None
+
+    return {'variants': variants, 'audio': audio_groups}
+
+
+def parse_media_playlist(content, base_url):
+    """
+        解析媒體播放清單 (media playlist)，回傳
+        {'url', 'content', 'init', 'segments', 'duration'}
+        init     : #EXT-X-MAP 的初始化分段 (fMP4)，沒有時為 None
+        segments : 分段的絕對網址 (依播放順序)
+        content 保留原始內容，由 iter_local_playlist_lines() 改寫為本機檔名
+    """
+    init_url = None
+    segments = []
+    duration = 0.0
+    for line in io.StringIO(content):
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith('#EXT-X-MAP:'):
+            uri = parse_attributes(line.split(':', 1)[1]).get('URI')
+            if uri:
+                init_url = urljoin(base_url, uri)
+        elif line.startswith('#EXTINF:'):
+            try:
+                duration += float(line.split(':', 1)[1].split(',')[0])
+            except ValueError:
+                pass
+        elif not line.startswith('#'):
+            segments.append(urljoin(base_url, line))
+
+    return {
+        'url'      : base_url,
+        'content'  : content,
+        'init'     : init_url,
+        'segments' : segments,
+        'duration' : duration,
+    }
+
+
+def iter_local_playlist_lines(content, rename):
+    """
+        逐行改寫媒體播放清單 : 分段網址與 #EXT-X-MAP 的 URI 改為 rename(uri) 的回傳值 (本機檔名)
+        每行只處理一次，耗時與播放清單大小成正比，可直接逐行寫入檔案
+    """
+    for line in io.StringIO(content):
+        stripped = line.strip()
+        if stripped.startswith('#EXT-X-MAP:'):
+            yield MAP_URI_PATTERN.sub(lambda matched: f'URI="{rename(matched.group(1))}"', stripped) + '\n'
+        elif stripped and not stripped.startswith('#'):
+            yield rename(stripped) + '\n'
+        else:
+            yield stripped + '\n'
+
+
+def select_variant(variants, policy = 'best', max_height = None):
+    """
+        依 policy 選出一個畫質
+        best / max_resolution : 解析度最高 (相同時位元率較高)
+        max_bitrate           : 位元率最高
+        min_bitrate           : 位元率最低
+        max_height            : 只考慮高度不超過 max_height 的畫質 (全部超過時取最低的一個)
+    """
+    if policy not in VARIANT_POLICIES:
+        raise ValueError(f"未知的畫質選擇方式 : {policy} (可用 : {', '.join(VARIANT_POLICIES)})")
+    if not variants:
+        return None
+
+    def pixels(variant):
+        resolution = variant['resolution']
+        return resolution[0] * resolution[1] if resolution else 0
+
+    if max_height is not None:
+        allowed = [variant for variant in variants if variant['resolution'] and variant['resolution'][1] <= max_height]
+        variants = allowed or [min(variants, key = pixels)]
+
+    if policy == 'max_bitrate':
+        return max(variants, key = lambda variant: (variant['bandwidth'], pixels(variant)))
+    if policy == 'min_bitrate':
+        return min(variants, key = lambda variant: (variant['bandwidth'], pixels(variant)))
+    return max(variants, key = lambda variant: (pixels(variant), variant['bandwidth']))
+
+
+def select_audio(master, variant):
+    """畫質對應的音訊 (AUDIO 群組中 DEFAULT=YES 的一個，沒有時取第一個)，沒有音訊時回傳 None"""
+    renditions = master['audio'].get(variant.get('audio')) or []
+    if not renditions:
+        return None
+    return next((rendition for rendition in renditions if rendition['default']), renditions[0])
+
+
+class PlaylistResolver():
+    """
+        由 network log 擷取到的 .m3u8 網址，為每支影片選出一個畫質的影像播放清單與對應的音訊播放清單
+
+        - 有主播放清單時依 policy 從其中的所有畫質選擇，音訊取該畫質的 AUDIO 群組
+        - 只擷取到媒體播放清單時 (播放器已選好畫質)，由網址中的尺寸選擇
+        - 只下載選中的播放清單，未選中的畫質不會有任何請求
+        - 選擇結果依 video_id 快取，同一支影片重複下載 (重試、多個推文引用) 時不再請求播放清單
+
+        fetch_text : 下載網址並回傳文字內容的函式
+    """
+    def __init__(self, fetch_text, policy = 'best', max_height = None, cache_size = 256):
+        if policy not in VARIANT_POLICIES:
+            raise ValueError(f"未知的畫質選擇方式 : {policy} (可用 : {', '.join(VARIANT_POLICIES)})")
+        self.fetch_text = fetch_text
+        self.policy = policy
+        self.max_height = max_height
+        self.cache_size = cache_size
+
+        # video_id -> {'video': 媒體播放清單, 'audio': 媒體播放清單 或 None}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, m3u8_urls):
+        """回傳 OrderedDict : video_id -> {'video', 'audio'} (皆為 parse_media_playlist() 的結果)"""
+        groups = OrderedDict()
+        for url in m3u8_urls:
+            groups.setdefault(get_video_id(url), []).append(url)
+
+        tracks = OrderedDict()
+        for video_id, urls in groups.items():
+            with self._lock:
+                cached = self._cache.get(video_id) if video_id is not None else None
+                if cached is not None:
+                    self._cache.move_to_end(video_id)
+            if cached is None:
+                cached = self._resolve_video(urls)
+                if video_id is not None:
+                    with self._lock:
+                        self._cache[video_id] = cached
+                        while len(self._cache) > self.cache_size:
+                            self._cache.popitem(last = False)
+            tracks[video_id] = cached
+
+        return tracks
+
+    def _fetch_media_playlist(self, url):
+        return parse_media_playlist(self.fetch_text(url), url) if url else None
+
+    def _resolve_video(self, urls):
+        video_candidates = []
+        audio_candidates = []
+        for url in urls:
+            track_format, resolution, bitrate = classify_playlist_url(url)
+            if track_format == 'video':
+                video_candidates.append({'url': url, 'bandwidth': 0, 'resolution': resolution, 'codecs': '', 'audio': None})
+                continue
+            if track_format == 'audio':
+                audio_candidates.append((bitrate or 0, url))
+                continue
+
+            # 主播放清單
+            content = self.fetch_text(url)
+            if not is_master_playlist(content):
+                # 無法由網址判斷的媒體播放清單 : 視為唯一的影像
+                return {'video': parse_media_playlist(content, url), 'audio': None}
+
+            master = parse_master_playlist(content, url)
+            variant = select_variant(master['variants'], self.policy, self.max_height)
+            if variant is None:
+                continue
+            audio = select_audio(master, variant)
+            return {
+                'video': self._fetch_media_playlist(variant['url']),
+                'audio': self._fetch_media_playlist(audio['url'] if audio else None),
+            }
+
+        variant = select_variant(video_candidates, self.policy, self.max_height)
+        audio_url = max(audio_candidates)[1] if audio_candidates else None
+        if variant is None:
+            # 只有音訊
+            return {'video': None, 'audio': self._fetch_media_playlist(audio_url)}
+        return {
+            'video': self._fetch_media_playlist(variant['url']),
+            'audio': self._fetch_media_playlist(audio_url),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
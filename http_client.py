@@ -0,0 +1,262 @@
+# 標準庫
+import http.client
+import time
+import queue
+import threading
+import urllib.error
+from pathlib import Path
+from urllib.parse import urlsplit, urljoin
+
+# 自定義模組導入
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+from metrics import get_metrics
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0',
+    'Connection': 'keep-alive',
+}
+
+# 跟隨重新導向的狀態碼與次數上限 (與 urlretrieve 相同)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+
+
+class HTTPClient():
+    """
+        共用的 HTTP 連線池，依主機 (scheme, host, port) 保留 keep-alive 連線重複使用
+        video.twimg.com / pbs.twimg.com 的小檔案不必每次都重新建立 TCP+TLS 連線
+    """
+    def __init__(self, pool_size = 8, timeout = 30, headers = None, chunk_size = 64 * 1024, rate_limiter = None, metrics = None):
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics or get_metrics()
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.headers = dict(DEFAULT_HEADERS)
+        if headers:
+            self.headers.update(headers)
+
+        self._pools = {}        # 閒置連線
+        self._slots = {}        # 每個主機同時使用中的連線上限
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'requests'           : 0,
+            'connections_created': 0,
+            'connections_reused' : 0,
+            'bytes_received'     : 0,
+        }
+
+    def _pool_key(self, url):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        return (parts.scheme, parts.hostname, port), path
+
+    def _count(self, key, value = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _count_bytes(self, host, value):
+        self._count('bytes_received', value)
+        self.metrics.inc('http_bytes_received_total', value, host = host)
+
+    def _acquire(self, pool_key):
+        with self._lock:
+            if pool_key not in self._pools:
+                self._pools[pool_key] = queue.LifoQueue()
+                self._slots[pool_key] = threading.BoundedSemaphore(self.pool_size)
+            pool, slots = self._pools[pool_key], self._slots[pool_key]
+
+        slots.acquire()
+        try:
+            return pool.get_nowait(), True
+        except queue.Empty:
+            scheme, host, port = pool_key
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            self._count('connections_created')
+            return connection_class(host, port, timeout = self.timeout), False
+
+    def _release(self, pool_key, connection, reusable):
+        if reusable:
+            self._pools[pool_key].put(connection)
+        else:
+            connection.close()
+        self._slots[pool_key].release()
+
+    def request(self, url, headers = None, on_response = None, max_redirects = MAX_REDIRECTS):
+        """
+            發送 GET 請求，on_response(response) 負責讀取內容並回傳結果
+            若沿用的連線已被伺服器關閉，換一條新連線重試一次
+            3xx 重新導向最多跟隨 max_redirects 次 (新網址的主機改用其連線池)，只有 2xx 視為成功
+        """
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+
+        redirects = 0
+        while True:
+            pool_key, path = self._pool_key(url)
+            host = pool_key[1]
+            if self.rate_limiter:
+                self.rate_limiter.acquire(host)
+
+            connection, reused = self._acquire(pool_key)
+            start_time = time.monotonic()
+            self.metrics.inc('http_connections_total', host = host, reused = reused)
+            try:
+                connection.request('GET', path, headers = request_headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self._release(pool_key, connection, False)
+                if reused:
+                    continue
+                self._record(host, error = True)
+                raise
+            except Exception:
+                self._release(pool_key, connection, False)
+                self._record(host, error = True)
+                raise
+
+            self._record(host, response.status, time.monotonic() - start_time, parse_retry_after(response.getheader('Retry-After')))
+
+            self._count('requests')
+            if reused:
+                self._count('connections_reused')
+
+            location = response.getheader('Location')
+            if response.status in REDIRECT_STATUSES and location and redirects < max_redirects:
+                # 讀完重新導向的內容，連線可繼續使用
+                try:
+                    response.read()
+                except Exception:
+                    self._release(pool_key, connection, False)
+                    raise
+                self._release(pool_key, connection, not response.will_close)
+                self.metrics.inc('http_redirects_total', host = host)
+                url = urljoin(url, location)
+                redirects += 1
+                continue
+
+            try:
+                if not 200 <= response.status < 300:
+                    response.read()
+                    raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+                result = on_response(response) if on_response else response.read()
+            except Exception:
+                self._release(pool_key, connection, False)
+                raise
+
+            self._release(pool_key, connection, not response.will_close)
+
+            # 含讀取回應內容的時間 (bytes / 此時間 = 單一連線的實際傳輸速率)
+            self.metrics.observe('http_transfer_seconds', time.monotonic() - start_time, host = host)
+            return result
+
+    def _record(self, host, status = None, latency = None, retry_after = None, error = False):
+        """將回應狀態與延遲回報給 rate_limiter (429 / 5xx 時降速) 及 metrics"""
+        if error:
+            self.metrics.inc('http_errors_total', host = host)
+        else:
+            self.metrics.inc('http_responses_total', host = host, status = status)
+            self.metrics.observe('http_response_seconds', latency, host = host)
+
+        if self.rate_limiter:
+            self.rate_limiter.record(host, status = status, latency = latency, error = error, retry_after = retry_after)
+
+    def get(self, url, headers = None):
+        """取得完整的回應內容 (bytes)"""
+        content = self.request(url, headers = headers)
+        self._count_bytes(urlsplit(url).hostname, len(content))
+        return content
+
+    def download(self, url, filepath, headers = None, resume = False, hasher = None):
+        """
+            以串流方式將回應寫入檔案，回傳檔案的位元組數
+            resume = True 時以 HTTP Range 從既有檔案的結尾續傳，hasher (hashlib 物件) 會涵蓋整個檔案內容
+            寫入的大小與 Content-Length 不符時 (連線中斷) 拋出 http.client.IncompleteRead，不視為下載完成
+        """
+        offset = 0
+        if resume and Path(filepath).exists():
+            offset = Path(filepath).stat().st_size
+
+        request_headers = dict(headers or {})
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+
+        received = 0
+
+        def write_to_file(response):
+            nonlocal received
+            mode, size = 'wb', 0
+            if offset and response.status == 206:
+                mode, size = 'ab', offset
+                if hasher is not None:
+                    with open(filepath, 'rb') as f:
+                        for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                            hasher.update(chunk)
+
+            with open(filepath, mode) as f:
+                while True:
+                    chunk = response.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    size += len(chunk)
+                    received += len(chunk)
+
+            content_length = response.getheader('Content-Length')
+            if content_length is not None and content_length.isdigit() and received != int(content_length):
+                raise http.client.IncompleteRead(b'', int(content_length) - received)
+            return size
+
+        try:
+            size = self.request(url, headers = request_headers, on_response = write_to_file)
+        except http.client.IncompleteRead:
+            # 續傳模式保留部分檔案供下次續傳，否則刪除不完整的檔案
+            if not resume:
+                Path(filepath).unlink(missing_ok = True)
+            raise
+        except urllib.error.HTTPError as e:
+            # 416 : 續傳位置超出檔案大小，重新完整下載
+            if e.code != 416 or not offset:
+                raise
+            Path(filepath).unlink()
+            return self.download(url, filepath, headers = headers, hasher = hasher)
+
+        self._count_bytes(urlsplit(url).hostname, received)
+        return size
+
+    def reuse_ratio(self):
+        """連線重複使用比例 (connections_reused / requests)"""
+        with self._lock:
+            requests = self.stats['requests']
+            return self.stats['connections_reused'] / requests if requests else 0.0
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """取得全域共用的 HTTPClient"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HTTPClient(rate_limiter = AdaptiveRateLimiter(rate = 50, max_rate = 500, additive_increase = 2))
+        return _default_client
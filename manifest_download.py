@@ -0,0 +1,118 @@
+"""
+    由推文清單下載媒體 : 不開啟瀏覽器，也不需要安裝 Selenium
+
+    推文清單為任何 TweetStore (提取時寫入的 twi@xxx_tweets.db，或 .jsonl / .xlsx)
+    - 依推文的 username 存放於 root_folder/twi@{username}/ (與提取時相同的資料夾與檔名)
+    - 各帳號資料夾的 .download_journal.jsonl / .seen_index.db 略過已下載的媒體，可重複執行以補下載
+    - --media-type 只下載指定類型，--since 只下載該時間 (含) 之後的推文
+    - --failed-output 將下載失敗的推文寫入 .jsonl，之後可作為推文清單重新下載
+
+    python manifest_download.py "../twitter post downloader/twi@xxx/twi@xxx_tweets.db" --root-folder "../twitter post downloader/"
+"""
+# 標準庫
+import time
+import argparse
+import threading
+from pathlib import Path
+
+# 自定義模組導入
+from media_downloader import TwitterMediaDownloader
+from twitter_video_downloader import TwitterVideoDownloader
+from http_client import get_default_client
+from download_journal import DownloadJournal
+from seen_index import SeenIndex
+from blob_store import BlobStore
+from pipeline import MediaPipeline
+from tweet_store import open_tweet_store
+from tweet_record import TweetRecord, write_records
+
+
+def iter_manifest(manifest_paths, media_types = None, since = None):
+    """依序讀取推文清單，產生符合條件的 TweetRecord"""
+    for manifest_path in manifest_paths:
+        if not Path(manifest_path).exists():
+            print(f"\033[91m[找不到推文清單] {manifest_path}\033[0m")
+            continue
+
+        tweet_store = open_tweet_store(manifest_path)
+        try:
+            for tweet in tweet_store.iter_tweets():
+                if media_types and tweet.media_type not in media_types:
+                    continue
+                if since and tweet.tweet_time < since:
+                    continue
+                yield tweet
+        finally:
+            tweet_store.close()
+
+
+class ManifestDownloader():
+    """
+        依推文的 username 交給各帳號的 TwitterMediaDownloader (作為 MediaPipeline 的 media_downloader)
+        連線池與內容定址儲存由所有帳號共用，影片以串流模式下載
+    """
+    def __init__(self, root_folder):
+        self.root_folder = Path(root_folder)
+        self.http_client = get_default_client()
+        self.blob_store = BlobStore(self.root_folder / '.blobs')
+
+        self._downloaders = {}
+        self._lock = threading.Lock()
+
+    def get_downloader(self, username):
+        with self._lock:
+            media_downloader = self._downloaders.get(username)
+            if media_downloader is None:
+                tweet_media_folder = self.root_folder / f"twi@{username}"
+                tweet_media_folder.mkdir(parents = True, exist_ok = True)
+
+                journal = DownloadJournal(tweet_media_folder / '.download_journal.jsonl')
+                video_downloader = TwitterVideoDownloader(None, http_client = self.http_client, stream_mode = True, journal = journal)
+                media_downloader = TwitterMediaDownloader(tweet_media_folder, video_downloader, http_client = self.http_client, journal = journal,
+                                                          seen_index = SeenIndex(tweet_media_folder / '.seen_index.db'),
+                                                          blob_store = self.blob_store)
+                self._downloaders[username] = media_downloader
+        return media_downloader
+
+    def download(self, tweet_content):
+        tweet = TweetRecord.coerce(tweet_content)
+        self.get_downloader(tweet.username).download(tweet)
+
+    def close(self):
+        with self._lock:
+            for media_downloader in self._downloaders.values():
+                media_downloader.seen_index.close()
+            self._downloaders.clear()
+        self.blob_store.close()
+
+
+if __name__ == '__main__':
+    startup_time = time.perf_counter()
+
+    parser = argparse.ArgumentParser(description = '由推文清單下載媒體 (不需要瀏覽器)')
+    parser.add_argument('manifests', nargs = '+', help = '推文清單 (.db / .jsonl / .xlsx)')
+    parser.add_argument('--root-folder', default = '../twitter post downloader/')
+    parser.add_argument('--workers', type = int, default = 4, help = '同時下載的推文數')
+    parser.add_argument('--media-type', nargs = '*', choices = ['image', 'video', 'gif'], help = '只下載指定的媒體類型')
+    parser.add_argument('--since', help = '只下載該時間之後的推文，例如 2024-10-01')
+    parser.add_argument('--failed-output', help = '下載失敗的推文寫入此 .jsonl')
+    args = parser.parse_args()
+
+    manifest_downloader = ManifestDownloader(args.root_folder)
+    pipeline = MediaPipeline(manifest_downloader, download_workers = args.workers)
+    try:
+        stats = pipeline.run(iter_manifest(args.manifests, args.media_type, args.since))
+    finally:
+        manifest_downloader.close()
+
+    print(f"推文 : {stats['extracted']}，下載 : {stats['downloaded']}，失敗 : {stats['failed']}")
+    if pipeline.first_tweet_time is not None:
+        print(f"第一則推文 : {pipeline.first_tweet_time - startup_time:.2f} 秒")
+
+    http_stats = manifest_downloader.http_client.stats
+    print(f"HTTP 請求 : {http_stats['requests']}，新建連線 : {http_stats['connections_created']}，重複使用 : {http_stats['connections_reused']}")
+
+    if args.failed_output and pipeline.failed_tweets:
+        with open(args.failed_output, 'wb') as f:
+            write_records(pipeline.failed_tweets, f)
+        print(f"\033[91m失敗的推文已寫入 {args.failed_output}\033[0m")
@@ -0,0 +1,131 @@
+# 標準庫
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import Future
+
+# 自定義模組導入
+from metrics import get_metrics
+from tweet_record import TweetRecord
+
+
+class TwitterMediaDownloader:
+    def __init__(self, tweet_media_folder, tweet_video_downloader, http_client = None, journal = None, seen_index = None,
+                 metrics = None, blob_store = None):
+        self.tweet_media_folder = tweet_media_folder
+        self.tweet_video_downloader = tweet_video_downloader
+        self.http_client = http_client or tweet_video_downloader.http_client
+        self.journal = journal
+        self.metrics = metrics or get_metrics()
+
+        # 已下載過的媒體網址 (同一媒體出現在多則推文時只下載一次)
+        self.seen_index = seen_index
+
+        # 內容定址儲存 : 相同的媒體 (轉推、不同帳號) 只下載並保存一份，每則推文的檔名皆為 hardlink
+        # 有 blob_store 時圖片/GIF 不以 seen_index 略過，已知的媒體直接建立 hardlink (不發送請求)
+        self.blob_store = blob_store
+
+    def download(self, tweet_content):
+        """
+            下載單則推文的媒體 (TweetRecord 或 content_dict，不保留推文狀態於物件上，可由多個執行緒同時呼叫)
+            每個媒體依其 kind 下載，同一則推文可混合圖片、GIF 與影片
+            所有媒體下載成功後才將推文記錄於 seen_index (下次執行不再提取)，失敗或中斷的推文會重新提取
+        """
+        tweet       = TweetRecord.coerce(tweet_content)
+        username    = tweet.username
+        status      = tweet.status
+        tweet_time  = tweet.tweet_time
+
+        # 轉換時間 2024-10-03T09:39:17.000Z -> 2410030939
+        dt = datetime.strptime(tweet_time, "%Y-%m-%dT%H:%M:%S.%fZ")
+        tweet_time = dt.strftime("%y%m%d%H%M")
+
+        # 點擊模式的影片為 .m3u8 (影像與音訊的播放清單)，整組交給 TwitterVideoDownloader
+        playlist_urls = []
+        video_count = 0
+        for idx, media in enumerate(tweet.media):
+            if media.kind == 'image':
+                self._download_file(media.url, f"twi@{username}_{tweet_time}_{status}_{idx + 1}.jpg")
+            elif media.kind == 'gif':
+                self._download_file(media.url, f"twi@{username}_{tweet_time}_{status}_{idx + 1}.mp4")
+            elif media.kind == 'video':
+                # 時間軸模式的影片為可直接下載的 mp4，檔名與 TwitterVideoDownloader 相同 (第二支起加上編號)
+                self._download_file(media.url, self._video_filename(username, status, video_count))
+                video_count += 1
+            elif media.kind == 'playlist':
+                playlist_urls.append(media.url)
+            else:
+                print(f"未定義的媒體類型：{media.kind}")
+
+        result = None
+        if playlist_urls or (tweet.media_type == 'video' and not video_count):
+            result = self._download_video(username, status, playlist_urls)
+
+        if self.seen_index is None:
+            return
+        # 合併在 merge_pool 中執行時，合併成功後才記錄
+        if isinstance(result, Future):
+            def record_status(future):
+                if future.exception() is None:
+                    self.seen_index.add_status(status)
+            result.add_done_callback(record_status)
+        else:
+            self.seen_index.add_status(status)
+
+    def _video_filename(self, username, status, index):
+        suffix = f"_{index}" if index else ''
+        return f"twi@{username}_{status}{suffix}.mp4"
+
+    def _download_video(self, username, status, media_links):
+        url = f"https://x.com/{username}/status/{status}"
+        if self.seen_index is not None and media_links and self.seen_index.has_media(media_links[0]):
+            return
+
+        result = self.tweet_video_downloader.download(url, m3u8_urls = media_links, folder = self.tweet_media_folder)
+        if self.seen_index is None or not media_links:
+            return result
+
+        # 合併在 merge_pool 中執行時，合併成功後才記錄
+        if isinstance(result, Future):
+            def record_seen(future):
+                if future.exception() is None:
+                    self.seen_index.add_media(media_links[:1])
+            result.add_done_callback(record_seen)
+        else:
+            self.seen_index.add_media(media_links[:1])
+        return result
+
+    def _download_file(self, url, filename):
+        if self.blob_store is None and self.seen_index is not None and self.seen_index.has_media(url):
+            return
+
+        filepath = self.tweet_media_folder / filename
+        self._fetch_file(url, filepath)
+
+        if self.seen_index is not None:
+            self.seen_index.add_media(url)
+
+    def _fetch_file(self, url, filepath):
+        kind = Path(filepath).suffix.lstrip('.')
+        if self.blob_store is not None:
+            with self.metrics.timer('file_download', kind = kind):
+                result = self.blob_store.fetch(url, filepath, self.http_client)
+            self.metrics.inc('blob_store_total', kind = kind, result = result)
+            return
+
+        if self.journal is None:
+            with self.metrics.timer('file_download', kind = kind):
+                size = self.http_client.download(url, filepath)
+            self.metrics.inc('file_bytes_total', size, kind = kind)
+            return
+
+        # 已完成的檔案直接跳過，中斷留下的部分檔案以 Range 續傳
+        if self.journal.is_complete(url, filepath):
+            self.metrics.inc('files_skipped_total', kind = kind)
+            return
+
+        hasher = hashlib.sha256()
+        with self.metrics.timer('file_download', kind = kind):
+            size = self.http_client.download(url, filepath, resume = True, hasher = hasher)
+        self.metrics.inc('file_bytes_total', size, kind = kind)
+        self.journal.record(url, filepath, size, hasher.hexdigest())
@@ -0,0 +1,88 @@
+# 標準庫
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 自定義模組導入
+from metrics import get_metrics
+
+
+class MergeWorkerPool():
+    """
+        ffmpeg 合併工作的背景執行池，與下載同時進行
+
+        - 每個工作啟動獨立的 ffmpeg 程序，CPU 工作在子程序中平行執行 (執行緒只負責等待，不受 GIL 影響)
+        - max_workers 預設為 CPU 核心數
+        - 等待中 + 執行中的工作達 queue_size 時 submit() 會等待，下載端隨之減速，暫存分段不會無限累積
+        - queue_depth 為目前等待中 + 執行中的工作數，同時記錄於 merge_queue_depth
+        - 失敗的工作記錄於 failures [(description, 例外)]，close() 等待所有工作完成
+
+        只用於暫存資料夾模式 (TwitterVideoDownloader(stream_mode = False, merge_pool = ...))，例如 twitter_video_downloader.py 的 __main__
+        get_media_click.py、batch_download.py、manifest_download.py 使用串流模式 (分段直接寫入 ffmpeg 的 stdin)，不經過 merge_pool
+    """
+    def __init__(self, max_workers = None, queue_size = None, metrics = None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.queue_size = queue_size or self.max_workers * 2
+        self.metrics = metrics or get_metrics()
+
+        self._executor = ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = 'ffmpeg')
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._lock = threading.Lock()
+        self._depth = 0
+
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0}
+        self.failures = []
+
+    @property
+    def queue_depth(self):
+        with self._lock:
+            return self._depth
+
+    def _update_depth(self, delta):
+        with self._lock:
+            self._depth += delta
+            depth = self._depth
+        self.metrics.set_gauge('merge_queue_depth', depth)
+
+    def submit(self, func, *args, description = None):
+        """排入合併工作，回傳 Future (佇列已滿時等待)"""
+        start_time = time.perf_counter()
+        self._slots.acquire()
+        self.metrics.observe('merge_submit_wait_seconds', time.perf_counter() - start_time)
+
+        self._update_depth(1)
+        with self._lock:
+            self.stats['submitted'] += 1
+        try:
+            return self._executor.submit(self._run, func, args, description)
+        except BaseException:
+            self._update_depth(-1)
+            self._slots.release()
+            raise
+
+    def _run(self, func, args, description):
+        try:
+            with self.metrics.timer('merge_job'):
+                result = func(*args)
+            with self._lock:
+                self.stats['completed'] += 1
+            return result
+        except Exception as e:
+            print(f"\033[91m[合併失敗] {description} : {e}\033[0m")
+            with self._lock:
+                self.stats['failed'] += 1
+                self.failures.append((description, e))
+            raise
+        finally:
+            self._update_depth(-1)
+            self._slots.release()
+
+    def close(self, wait = True):
+        self._executor.shutdown(wait = wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,250 @@
+# 標準庫
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+
+# 秒數直方圖的區間上限，包含 WebDriverWait 常用的 2 秒逾時
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+# 位元組數直方圖的區間上限 (1 KB ~ 64 MB)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra = ()):
+    items = list(label_key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Histogram():
+    def __init__(self, buckets = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """由區間估計分位數 (回傳所在區間的上限，超過最大區間時回傳最大值)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics():
+    """
+        各階段的計數器與耗時直方圖，可匯出為 Prometheus 文字格式或 JSONL
+
+        inc('bytes_total', size, kind = 'segment')           計數器
+        set_gauge('merge_queue_depth', 3)                    目前值 (可增可減)
+        observe('queue_wait_seconds', 0.3)                   直方圖
+        with timer('webdriver_wait', step = 'time'): ...     耗時記錄於 webdriver_wait_seconds，
+                                                             發生例外時 webdriver_wait_errors_total (error = 例外名稱) 加一
+    """
+    def __init__(self, namespace = 'twitter_downloader', buckets = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.start_time = time.time()
+
+        self._counters = {}         # name -> {label_key: value}
+        self._gauges = {}           # name -> {label_key: value}
+        self._histograms = {}       # name -> {label_key: Histogram}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name, value, buckets = None, **labels):
+        """buckets : 第一次記錄該指標時使用的區間 (預設為 self.buckets)"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets or self.buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                self.inc(f'{name}_errors_total', error = type(e).__name__, **labels)
+            raise
+        finally:
+            self.observe(f'{name}_seconds', time.perf_counter() - start_time, **labels)
+
+    def get_counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def get_gauge(self, name, **labels):
+        with self._lock:
+            return self._gauges.get(name, {}).get(_label_key(labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+        self.start_time = time.time()
+
+    def snapshot(self):
+        """目前所有指標 (可直接 json.dumps)"""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(key), 'value': value}
+                for name, series in sorted(self._counters.items()) for key, value in series.items()
+            ]
+            gauges = [
+                {'name': name, 'labels': dict(key), 'value': value}
+                for name, series in sorted(self._gauges.items()) for key, value in series.items()
+            ]
+            histograms = [
+                {
+                    'name'  : name,
+                    'labels': dict(key),
+                    'count' : histogram.count,
+                    'sum'   : round(histogram.sum, 6),
+                    'p50'   : histogram.quantile(0.5),
+                    'p99'   : histogram.quantile(0.99),
+                    'max'   : round(histogram.max, 6),
+                }
+                for name, series in sorted(self._histograms.items()) for key, histogram in series.items()
+            ]
+
+        now = time.time()
+        return {
+            'timestamp'     : now,
+            'uptime_seconds': round(now - self.start_time, 3),
+            'counters'      : counters,
+            'gauges'        : gauges,
+            'histograms'    : histograms,
+        }
+
+    def to_prometheus(self):
+        """Prometheus 文字格式 (text/plain; version=0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = f'{self.namespace}_{name}'
+                lines.append(f'# TYPE {full_name} counter')
+                for key, value in series.items():
+                    lines.append(f'{full_name}{_format_labels(key)} {value}')
+
+            for name, series in sorted(self._gauges.items()):
+                full_name = f'{self.namespace}_{name}'
+                lines.append(f'# TYPE {full_name} gauge')
+                for key, value in series.items():
+                    lines.append(f'{full_name}{_format_labels(key)} {value}')
+
+            for name, series in sorted(self._histograms.items()):
+                full_name = f'{self.namespace}_{name}'
+                lines.append(f'# TYPE {full_name} histogram')
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{full_name}_bucket{_format_labels(key, [("le", str(bound))])} {cumulative}')
+                    lines.append(f'{full_name}_bucket{_format_labels(key, [("le", "+Inf")])} {histogram.count}')
+                    lines.append(f'{full_name}_sum{_format_labels(key)} {histogram.sum}')
+                    lines.append(f'{full_name}_count{_format_labels(key)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_jsonl(self, jsonl_path):
+        """附加一行目前的指標至 JSONL 檔案"""
+        with open(jsonl_path, 'a', encoding = 'utf-8') as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii = False) + '\n')
+
+    def start_jsonl_export(self, jsonl_path, interval = 30):
+        """
+            每 interval 秒附加一行指標至 jsonl_path，回傳 stop()，呼叫時再寫入最後一行並停止
+        """
+        jsonl_path = Path(jsonl_path)
+        stop_event = threading.Event()
+
+        def export_loop():
+            while not stop_event.wait(interval):
+                self.write_jsonl(jsonl_path)
+
+        thread = threading.Thread(target = export_loop, daemon = True)
+        thread.start()
+
+        def stop():
+            stop_event.set()
+            thread.join()
+            self.write_jsonl(jsonl_path)
+
+        return stop
+
+    def start_http_server(self, port = 9464, host = '127.0.0.1'):
+        """在背景提供 http://host:port/metrics (Prometheus 抓取用)，回傳 server (server.shutdown() 停止)"""
+        # 只有提供 HTTP 端點時才載入 http.server (縮短不需要的程式的啟動時間)
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target = server.serve_forever, daemon = True).start()
+        return server
+
+
+_default_metrics = Metrics()
+
+
+def get_metrics():
+    """取得全域共用的 Metrics"""
+    return _default_metrics
@@ -0,0 +1,227 @@
+# 標準庫
+import re
+import json
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+# 自定義模組導入
+from metrics import get_metrics
+from hls_parser import get_video_id
+
+
+# Network.loadingFinished 的傳輸位元組數 (以正則表達式取得，不需 json.loads)
+ENCODED_DATA_LENGTH_PATTERN = re.compile(r'"encodedDataLength":\s*([\d.]+)')
+
+# 尚未取出的 .m3u8 最多保留的影片數 (媒體頁面會預先載入未點開的影片)
+MAX_M3U8_VIDEOS = 256
+
+
+class NetworkCapture():
+    """
+        增量讀取瀏覽器的 performance log，擷取 Network.responseReceived 中的 .m3u8 網址
+
+        - 每則 log 先以字串比對過濾，只有可能相關的事件才做 json.loads
+        - 已讀取的網址保留在 buffer 中，同一個 driver 的所有使用者共用 (get_log 讀取後即清空)
+        - expect() 回傳 Future，對應的 .m3u8 一出現就完成，不必等待固定的輪詢間隔
+        - .m3u8 依 video_id 分組，wait_for_m3u8(video_id) 取出後即移除，最多保留 MAX_M3U8_VIDEOS 支影片
+        - watch_responses() 登記網址關鍵字，載入完成的回應可透過 CDP Network.getResponseBody 取得內容
+        - bytes_received / blocked_requests 累計瀏覽器實際傳輸的位元組數與被封鎖的請求數 (ResourceBlocker)
+    """
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, driver, poll_interval = 0.05, metrics = None):
+        self.driver = driver
+        self.poll_interval = poll_interval
+        self.metrics = metrics or get_metrics()
+
+        # video_id -> [.m3u8 網址, ...] (網址中沒有 video_id 時為 None)
+        self.m3u8_urls = OrderedDict()
+        self._waiters = []
+
+        # 登記的網址關鍵字，以及等待載入完成 / 已載入完成的回應 (requestId -> url)
+        self._watched_keywords = []
+        self._pending_requests = {}
+        self._finished_requests = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.bytes_received = 0
+        self.blocked_requests = 0
+
+    @classmethod
+    def for_driver(cls, driver):
+        """同一個 driver 共用同一個 NetworkCapture"""
+        with cls._instances_lock:
+            if driver not in cls._instances:
+                cls._instances[driver] = cls(driver)
+            return cls._instances[driver]
+
+    def pump(self):
+        """讀取目前累積的 log，回傳新增的 .m3u8 網址數量"""
+        with self._lock:
+            count = 0
+            for log in self.driver.get_log('performance'):
+                raw_message = log['message']
+
+                if 'Network.loadingFinished' in raw_message:
+                    matched = ENCODED_DATA_LENGTH_PATTERN.search(raw_message)
+                    if matched:
+                        self.bytes_received += int(float(matched.group(1)))
+
+                    if self._pending_requests:
+                        message = json.loads(raw_message)['message']
+                        request_id = message.get('params', {}).get('requestId')
+                        if message.get('method') == 'Network.loadingFinished' and request_id in self._pending_requests:
+                            self._finished_requests[request_id] = self._pending_requests.pop(request_id)
+                    continue
+
+                if 'blockedReason' in raw_message and 'Network.loadingFailed' in raw_message:
+                    self.blocked_requests += 1
+                    continue
+
+                if 'Network.responseReceived' not in raw_message:
+                    continue
+                is_m3u8 = '.m3u8' in raw_message
+                is_watched = any(keyword in raw_message for keyword in self._watched_keywords)
+                if not is_m3u8 and not is_watched:
+                    continue
+
+                message = json.loads(raw_message)['message']
+                if message.get('method') != 'Network.responseReceived':
+                    continue
+
+                try:
+                    response_url = message['params']['response']['url']
+                except KeyError:
+                    continue
+
+                if is_watched:
+                    for keyword in self._watched_keywords:
+                        if keyword in response_url:
+                            self._pending_requests[message['params']['requestId']] = response_url
+
+                # 主播放清單的網址帶有查詢參數 (?tag=...)
+                if urlsplit(response_url).path.endswith('.m3u8') and self._add_m3u8(response_url):
+                    self._resolve(response_url)
+                    count += 1
+
+            return count
+
+    def _add_m3u8(self, url):
+        """加入 .m3u8 網址 (已存在時回傳 False)，超過 MAX_M3U8_VIDEOS 支影片時捨棄最舊的"""
+        video_id = get_video_id(url)
+        urls = self.m3u8_urls.setdefault(video_id, [])
+        if url in urls:
+            return False
+        urls.append(url)
+        self.m3u8_urls.move_to_end(video_id)
+        while len(self.m3u8_urls) > MAX_M3U8_VIDEOS:
+            self.m3u8_urls.popitem(last = False)
+        return True
+
+    def _resolve(self, url):
+        for video_id, future in list(self._waiters):
+            if video_id is None or video_id in url:
+                self._waiters.remove((video_id, future))
+                future.set_result(url)
+
+    def expect(self, video_id = None):
+        """
+            回傳 Future，第一個符合 video_id 的 .m3u8 出現時完成 (video_id = None 時任何 .m3u8 皆符合)
+        """
+        future = Future()
+        with self._lock:
+            matched = self.get_m3u8_urls(video_id)
+            if matched:
+                future.set_result(matched[0])
+            else:
+                self._waiters.append((video_id, future))
+        return future
+
+    def get_m3u8_urls(self, video_id = None):
+        """符合 video_id 的 .m3u8 網址 (video_id = None 時為全部)，不移除"""
+        with self._lock:
+            if video_id is None:
+                return [url for urls in self.m3u8_urls.values() for url in urls]
+            return self.m3u8_urls.get(video_id, []) + [url for url in self.m3u8_urls.get(None, []) if video_id in url]
+
+    def pop_m3u8_urls(self, video_id):
+        """取出並移除符合 video_id 的 .m3u8 網址"""
+        with self._lock:
+            urls = self.m3u8_urls.pop(video_id, [])
+            unknown = self.m3u8_urls.get(None)
+            if unknown:
+                matched = [url for url in unknown if video_id in url]
+                self.m3u8_urls[None] = [url for url in unknown if url not in matched]
+                urls += matched
+            return urls
+
+    def wait_for_m3u8(self, video_id = None, timeout = 5, settle = 0.2):
+        """
+            等待符合 video_id 的 .m3u8，回傳所有符合的網址 (指定 video_id 時取出後即移除)
+            第一個網址出現後再等待 settle 秒，收集緊接著請求的影像/音訊 .m3u8
+        """
+        start_time = time.perf_counter()
+        future = self.expect(video_id)
+        deadline = time.time() + timeout
+        while not future.done() and time.time() < deadline:
+            self.pump()
+            if not future.done():
+                time.sleep(self.poll_interval)
+
+        # 從開始等待到第一個 .m3u8 出現的時間
+        outcome = 'found' if future.done() else 'timeout'
+        self.metrics.observe('m3u8_discovery_seconds', time.perf_counter() - start_time, outcome = outcome)
+
+        if not future.done():
+            with self._lock:
+                if (video_id, future) in self._waiters:
+                    self._waiters.remove((video_id, future))
+            return []
+
+        settle_deadline = min(deadline, time.time() + settle)
+        while time.time() < settle_deadline:
+            time.sleep(self.poll_interval)
+            self.pump()
+
+        if video_id is None:
+            return self.get_m3u8_urls()
+        return self.pop_m3u8_urls(video_id)
+
+    def watch_responses(self, keyword):
+        """登記要保留回應內容的網址關鍵字，例如 GraphQL 的 'UserMedia'"""
+        with self._lock:
+            if keyword not in self._watched_keywords:
+                self._watched_keywords.append(keyword)
+
+    def pop_response_bodies(self):
+        """
+            取出已載入完成的回應內容 (透過 CDP Network.getResponseBody)，回傳 [(url, body), ...]
+            內容已被瀏覽器釋放的回應會被略過
+        """
+        self.pump()
+        with self._lock:
+            finished = list(self._finished_requests.items())
+            self._finished_requests.clear()
+
+        bodies = []
+        for request_id, url in finished:
+            try:
+                result = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            except Exception:
+                continue
+            bodies.append((url, result.get('body', '')))
+
+        return bodies
+
+    def reset(self):
+        """清空目前的 log 與已擷取的網址，通常在載入新頁面前呼叫"""
+        with self._lock:
+            self.driver.get_log('performance')
+            self.m3u8_urls.clear()
+            self._pending_requests.clear()
+            self._finished_requests.clear()
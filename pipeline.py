@@ -0,0 +1,81 @@
+# 標準庫
+import time
+import queue
+import threading
+
+
+class MediaPipeline():
+    """
+        提取與下載同時進行 : 提取端 (瀏覽器所在的執行緒) 每解析出一則推文就放入佇列，
+        download_workers 個下載執行緒立即取出並下載
+
+        - 佇列上限 queue_size，下載跟不上時提取端會等待 (backpressure)
+        - 提取結束後送出結束訊號，下載端處理完佇列中剩餘的推文再結束
+        - 提取端發生例外時停止下載，佇列中剩餘的推文不下載，記錄為失敗 (failed_tweets)，每則提取的推文皆計入統計
+    """
+    _STOP = object()
+
+    def __init__(self, media_downloader, download_workers = 4, queue_size = 16):
+        self.media_downloader = media_downloader
+        self.download_workers = download_workers
+        self.tweet_queue = queue.Queue(maxsize = queue_size)
+        self.abort_event = threading.Event()
+
+        self.stats = {'extracted': 0, 'downloaded': 0, 'failed': 0}
+        self.failed_tweets = []
+
+        # 第一則推文提取完成的時間 (time.perf_counter())，用於計算 time-to-first-tweet
+        self.first_tweet_time = None
+        self._lock = threading.Lock()
+
+    def _download_worker(self):
+        while True:
+            tweet_content = self.tweet_queue.get()
+            try:
+                if tweet_content is self._STOP:
+                    break
+                if self.abort_event.is_set():
+                    with self._lock:
+                        self.stats['failed'] += 1
+                        self.failed_tweets.append(tweet_content)
+                    continue
+
+                self.media_downloader.download(tweet_content)
+                with self._lock:
+                    self.stats['downloaded'] += 1
+            except Exception as e:
+                print(f"\033[91m[下載失敗] {tweet_content['url']} : {e}\033[0m")
+                with self._lock:
+                    self.stats['failed'] += 1
+                    self.failed_tweets.append(tweet_content)
+            finally:
+                self.tweet_queue.task_done()
+
+    def run(self, tweet_iterator):
+        """
+            tweet_iterator : 產生 TweetRecord 的產生器，例如 TwitterMediaLinkExtractor.iter_media_content(...)
+            在呼叫端的執行緒中執行提取 (WebDriver 只能由同一執行緒操作)，回傳統計資料
+        """
+        workers = []
+        for _ in range(self.download_workers):
+            worker = threading.Thread(target = self._download_worker, daemon = True)
+            worker.start()
+            workers.append(worker)
+
+        try:
+            for tweet_content in tweet_iterator:
+                if self.first_tweet_time is None:
+                    self.first_tweet_time = time.perf_counter()
+                self.tweet_queue.put(tweet_content)
+                with self._lock:
+                    self.stats['extracted'] += 1
+        except BaseException:
+            self.abort_event.set()
+            raise
+        finally:
+            for _ in workers:
+                self.tweet_queue.put(self._STOP)
+            for worker in workers:
+                worker.join()
+
+        return self.stats
@@ -0,0 +1,125 @@
+# 標準庫
+import time
+import threading
+
+
+class TokenBucket():
+    """
+        令牌桶 : 每秒補充 rate 個令牌，最多累積 capacity 個
+        acquire() 取得一個令牌，不足時等待
+    """
+    def __init__(self, rate, capacity = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.pause_until = 0
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """取得一個令牌，回傳等待的秒數"""
+        waited = 0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.pause_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_time = max(self.pause_until - now, (1 - self.tokens) / self.rate)
+
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds):
+        """暫停發送 (例如伺服器回傳 Retry-After)"""
+        with self._lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class AdaptiveRateLimiter():
+    """
+        依主機分開的令牌桶，以 AIMD 調整速率
+        - 成功 : 速率增加 additive_increase (每秒請求數)，最多 max_rate
+        - 被限流 (429 / 5xx / 連線錯誤) 或回應時間超過 latency_target : 速率乘以 decrease_factor，最少 min_rate
+          同一批已送出的請求可能同時被限流，decrease_cooldown 秒內只降速一次
+        - 回應帶有 Retry-After 時暫停該主機
+    """
+    THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate = 10, min_rate = 0.5, max_rate = 100, additive_increase = 0.5, decrease_factor = 0.5,
+                 latency_target = None, burst = 1, decrease_cooldown = 1.0, host_rates = None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.additive_increase = additive_increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.burst = burst
+        self.decrease_cooldown = decrease_cooldown
+
+        # 個別主機的初始速率，例如 {'x.com': 0.5}
+        self.host_rates = host_rates or {}
+
+        self._buckets = {}
+        self._last_decrease = {}
+        self._lock = threading.Lock()
+
+        self.stats = {'requests': 0, 'throttled': 0, 'waited': 0.0}
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.host_rates.get(host, self.rate), self.burst)
+                self._last_decrease[host] = 0
+            return self._buckets[host]
+
+    def acquire(self, host):
+        waited = self._bucket(host).acquire()
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['waited'] += waited
+        return waited
+
+    def record(self, host, status = None, latency = None, error = False, retry_after = None):
+        """回報請求結果，調整該主機的速率"""
+        bucket = self._bucket(host)
+
+        is_throttled = error or status in self.THROTTLE_STATUSES
+        is_slow = self.latency_target is not None and latency is not None and latency > self.latency_target
+
+        if retry_after:
+            bucket.pause(retry_after)
+
+        if is_throttled or is_slow:
+            now = time.monotonic()
+            with self._lock:
+                if is_throttled:
+                    self.stats['throttled'] += 1
+                if now - self._last_decrease[host] < self.decrease_cooldown:
+                    return
+                self._last_decrease[host] = now
+            bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease_factor))
+        else:
+            bucket.set_rate(min(self.max_rate, bucket.rate + self.additive_increase))
+
+    def get_rate(self, host):
+        return self._bucket(host).rate
+
+
+def parse_retry_after(value):
+    """Retry-After 標頭 (秒數)，無法解析時回傳 None"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,61 @@
+# 標準庫
+import threading
+import weakref
+
+
+# 提取時不需要的資源 : 影片/GIF 分段、縮圖、大頭貼、網頁字型
+# .m3u8 播放清單不在其中，仍可由 NetworkCapture 擷取
+DEFAULT_BLOCKED_URLS = [
+    '*.m4s*',
+    '*video.twimg.com/*.mp4*',
+    '*pbs.twimg.com/media/*',
+    '*pbs.twimg.com/*_thumb/*',
+    '*pbs.twimg.com/profile_images/*',
+    '*pbs.twimg.com/profile_banners/*',
+    '*pbs.twimg.com/card_img/*',
+    '*.woff*',
+    '*.ttf*',
+    '*.otf*',
+]
+
+
+class ResourceBlocker():
+    """
+        以 CDP Network.setBlockedURLs 封鎖瀏覽器的請求 (萬用字元 *)
+        被封鎖的請求在 performance log 中為 Network.loadingFailed (blockedReason)，由 NetworkCapture 計數
+
+        影片的 .m4s 分段由 TwitterVideoDownloader 另外下載，瀏覽器只需要請求 .m3u8
+    """
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, driver, blocked_urls = None):
+        self.driver = driver
+        self.blocked_urls = list(DEFAULT_BLOCKED_URLS if blocked_urls is None else blocked_urls)
+        self.enabled = False
+
+    @classmethod
+    def for_driver(cls, driver):
+        """同一個 driver 共用同一個 ResourceBlocker"""
+        with cls._instances_lock:
+            if driver not in cls._instances:
+                cls._instances[driver] = cls(driver)
+            return cls._instances[driver]
+
+    def enable(self, blocked_urls = None):
+        """開始封鎖 (重複呼叫時只在清單變更後重新設定)"""
+        if blocked_urls is not None:
+            blocked_urls = list(blocked_urls)
+            if blocked_urls != self.blocked_urls:
+                self.blocked_urls = blocked_urls
+                self.enabled = False
+        if self.enabled:
+            return
+
+        self.driver.execute_cdp_cmd('Network.enable', {})
+        self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+        self.enabled = True
+
+    def disable(self):
+        self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+        self.enabled = False
@@ -0,0 +1,87 @@
+# 標準庫
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+
+
+class SeenIndex():
+    """
+        已處理過的推文 (status) 與媒體網址的索引，增量執行時在點開推文/下載之前先檢查
+
+        - 記憶體中保存每個 key 的 64-bit 雜湊 (set)，未出現過的 key 不需查詢資料庫
+        - 雜湊命中時再以 SQLite 主鍵確認，避免雜湊碰撞造成誤判
+    """
+    STATUS = 'status'
+    MEDIA = 'media'
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread = False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                kind TEXT,
+                key  TEXT,
+                PRIMARY KEY (kind, key)
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+
+        self._hashes = {self.STATUS: set(), self.MEDIA: set()}
+        for kind, key in self.connection.execute('SELECT kind, key FROM seen'):
+            self._hashes.setdefault(kind, set()).add(self._hash(key))
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size = 8).digest(), 'little')
+
+    def contains(self, kind, key):
+        if self._hash(key) not in self._hashes[kind]:
+            return False
+
+        with self._lock:
+            row = self.connection.execute('SELECT 1 FROM seen WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return row is not None
+
+    def add(self, kind, keys):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        with self._lock:
+            self.connection.executemany('INSERT OR IGNORE INTO seen (kind, key) VALUES (?, ?)', [(kind, key) for key in keys])
+            self.connection.commit()
+            self._hashes[kind].update(self._hash(key) for key in keys)
+
+    def remove(self, kind, keys):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        with self._lock:
+            self.connection.executemany('DELETE FROM seen WHERE kind = ? AND key = ?', [(kind, key) for key in keys])
+            self.connection.commit()
+            # 不同 key 的 hash 可能相同，直接移除 hash 會讓仍存在的 key 被誤判為未處理，因此由 SQLite 重建
+            self._hashes[kind] = {self._hash(key) for key, in self.connection.execute('SELECT key FROM seen WHERE kind = ?', (kind,))}
+
+    def has_status(self, status):
+        return self.contains(self.STATUS, str(status))
+
+    def add_status(self, statuses):
+        if isinstance(statuses, (str, int)):
+            statuses = [statuses]
+        self.add(self.STATUS, [str(status) for status in statuses])
+
+    def remove_status(self, statuses):
+        """下載失敗的推文移出索引，下次執行時重新提取"""
+        if isinstance(statuses, (str, int)):
+            statuses = [statuses]
+        self.remove(self.STATUS, [str(status) for status in statuses])
+
+    def has_media(self, media_url):
+        return self.contains(self.MEDIA, media_url)
+
+    def add_media(self, media_urls):
+        self.add(self.MEDIA, media_urls)
+
+    def __len__(self):
+        return sum(len(hashes) for hashes in self._hashes.values())
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
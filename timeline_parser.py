@@ -0,0 +1,152 @@
+# 標準庫
+import json
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+
+# 自定義模組導入
+from tweet_record import TweetRecord
+
+
+# GraphQL 媒體頁面 (UserMedia) 的媒體類型 -> TweetRecord 的 media_type
+MEDIA_TYPES = {
+    'photo'        : 'image',
+    'video'        : 'video',
+    'animated_gif' : 'gif',
+}
+
+
+# pbs.twimg.com 圖片的尺寸 (name 參數)，orig 為原始檔案
+IMAGE_SIZES = ('thumb', 'small', 'medium', 'large', '4096x4096', 'orig')
+
+
+def resolve_image_url(url, image_size = 'orig'):
+    """
+        將 pbs.twimg.com/media 的圖片網址改為指定尺寸，其他網址不變
+        https://pbs.twimg.com/media/GY1abc.jpg                      -> https://pbs.twimg.com/media/GY1abc?format=jpg&name=orig
+        https://pbs.twimg.com/media/GY1abc?format=png&name=small    -> https://pbs.twimg.com/media/GY1abc?format=png&name=orig
+    """
+    parts = urlsplit(url)
+    if parts.hostname != 'pbs.twimg.com' or not parts.path.startswith('/media/'):
+        return url
+
+    # 舊格式 : /media/GY1abc.jpg:large
+    path = parts.path.split(':')[0]
+    image_format = parse_qs(parts.query).get('format', [None])[0]
+    folder, name = path.rsplit('/', 1)
+    if '.' in name:
+        name, extension = name.rsplit('.', 1)
+        image_format = image_format or extension
+
+    return f"https://pbs.twimg.com{folder}/{name}?format={image_format or 'jpg'}&name={image_size}"
+
+
+def iter_tweet_results(node):
+    """
+        遞迴尋找回應中所有的 tweet_results.result
+        第一頁在 TimelineAddEntries 的 profile-grid 模組內，之後的分頁在 TimelineAddToModule 內，直接走訪整棵樹較不受結構變動影響
+    """
+    if isinstance(node, dict):
+        tweet_results = node.get('tweet_results')
+        if isinstance(tweet_results, dict) and 'result' in tweet_results:
+            yield tweet_results['result']
+            return
+        for value in node.values():
+            yield from iter_tweet_results(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_tweet_results(value)
+
+
+def convert_tweet_time(created_at):
+    """
+        轉換時間 Thu Oct 03 09:39:17 +0000 2024 -> 2024-10-03T09:39:17.000Z (與 <time datetime> 相同格式)
+    """
+    dt = datetime.strptime(created_at, '%a %b %d %H:%M:%S %z %Y')
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def get_best_mp4_url(media):
+    """從 video_info.variants 中選出位元率最高的 mp4"""
+    variants = media.get('video_info', {}).get('variants', [])
+    mp4_variants = [variant for variant in variants if variant.get('content_type') == 'video/mp4']
+    if not mp4_variants:
+        return None
+    return max(mp4_variants, key = lambda variant: variant.get('bitrate', 0))['url']
+
+
+def get_media_links(media_list, image_size = 'orig'):
+    """
+        每個媒體依其類型取得網址 (同一則推文可混合圖片與影片)
+        圖片為 image_size 尺寸，影片 / GIF 為位元率最高的 mp4
+    """
+    media_links = []
+    for media in media_list:
+        if media.get('type') == 'photo':
+            media_links.append(resolve_image_url(media['media_url_https'], image_size))
+            continue
+        url = get_best_mp4_url(media)
+        if url:
+            media_links.append(url)
+    return media_links
+
+
+def parse_tweet(tweet, image_size = 'orig'):
+    """
+        將 GraphQL 的單則推文轉換為 TweetRecord (與 get_clicked_media_content 相同欄位)
+        沒有媒體或無法解析的推文回傳 None，圖片網址為 image_size 尺寸
+    """
+    # 受限制的推文包在 TweetWithVisibilityResults 內
+    if tweet.get('__typename') == 'TweetWithVisibilityResults':
+        tweet = tweet.get('tweet', {})
+
+    legacy = tweet.get('legacy')
+    if not legacy:
+        return None
+
+    media_list = legacy.get('extended_entities', {}).get('media', [])
+    if not media_list:
+        return None
+
+    media_type = MEDIA_TYPES.get(media_list[0].get('type'), 'image')
+    username = tweet['core']['user_results']['result']['legacy']['screen_name']
+    status = tweet['rest_id']
+
+    # 網址格式與媒體格子中的連結相同 : https://x.com/{username}/status/{status}/photo/1
+    url_media_type = 'video' if media_type == 'video' else 'photo'
+    tweet_url = f"https://x.com/{username}/status/{status}/{url_media_type}/1"
+
+    # 去除內文結尾的媒體短網址 (https://t.co/...)
+    tweet_text = legacy.get('full_text', '')
+    for media in media_list:
+        tweet_text = tweet_text.replace(media.get('url', ''), '')
+    tweet_text = tweet_text.strip()
+
+    views = tweet.get('views', {}).get('count', 0)
+    media_links = get_media_links(media_list, image_size)
+
+    return TweetRecord(
+        tweet_url, status, username, convert_tweet_time(legacy['created_at']), tweet_text,
+        media_links, media_type,
+        reply    = int(legacy.get('reply_count', 0)),
+        retweet  = int(legacy.get('retweet_count', 0)),
+        like     = int(legacy.get('favorite_count', 0)),
+        bookmark = int(legacy.get('bookmark_count', 0)),
+        view     = int(views),
+    )
+
+
+def parse_timeline_response(body, image_size = 'orig'):
+    """解析 UserMedia 回應 (JSON 字串或已解析的 dict)，回傳 TweetRecord 的 list"""
+    if isinstance(body, (str, bytes)):
+        body = json.loads(body)
+
+    tweet_content_list = []
+    for tweet in iter_tweet_results(body):
+        try:
+            tweet_record = parse_tweet(tweet, image_size)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if tweet_record:
+            tweet_content_list.append(tweet_record)
+
+    return tweet_content_list
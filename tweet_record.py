@@ -0,0 +1,243 @@
+# 標準庫
+import re
+import json
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+
+# 推文欄位 (儲存與匯出的欄位順序)
+TWEET_COLUMNS = ['url', 'status', 'username', 'tweet_time', 'tweet_text', 'media_links',
+                 'media_type', 'reply', 'retweet', 'like', 'bookmark', 'view', 'created_time']
+
+ENGAGEMENT_KEYS = ('reply', 'retweet', 'like', 'bookmark', 'view')
+
+# 推文視窗互動數的 aria-label，例如 "12 則回覆、34 次轉發、567 個喜歡、8 個書籤、9012 次觀看"
+ENGAGEMENT_PATTERNS = {
+    'reply'   : re.compile(r'(\d+) 則回覆'),
+    'retweet' : re.compile(r'(\d+) 次轉發'),
+    'like'    : re.compile(r'(\d+) 個喜歡'),
+    'bookmark': re.compile(r'(\d+) 個書籤'),
+    'view'    : re.compile(r'(\d+) 次觀看'),
+}
+
+# https://x.com/{username}/status/{status}/photo/1
+TWEET_URL_PATTERN = re.compile(r'/([^/]+)/status/(\d+)')
+
+# encode() 的格式版本 (JSON 陣列的第一個元素)，欄位順序改變時遞增
+CODEC_VERSION = 1
+
+
+def parse_engagement(text):
+    """互動數的 aria-label -> {'reply', 'retweet', 'like', 'bookmark', 'view'} (找不到的項目為 0)"""
+    engagement = dict.fromkeys(ENGAGEMENT_KEYS, 0)
+    if not text:
+        return engagement
+    for key, pattern in ENGAGEMENT_PATTERNS.items():
+        matched = pattern.search(text)
+        if matched:
+            engagement[key] = int(matched.group(1))
+    return engagement
+
+
+def parse_tweet_url(tweet_url):
+    """推文網址 -> (username, status)，格式不符時回傳 (None, None)"""
+    matched = TWEET_URL_PATTERN.search(tweet_url or '')
+    if not matched:
+        return None, None
+    return matched.group(1), matched.group(2)
+
+
+def classify_media_url(url, default = None):
+    """
+        由網址判斷單一媒體的類型 (同一則推文可混合圖片與影片)，無法判斷時回傳 default
+        .m3u8 -> 'playlist' ; video.twimg.com/tweet_video/ -> 'gif' ; 其他 video.twimg.com -> 'video' ; pbs.twimg.com -> 'image'
+    """
+    parts = urlsplit(url)
+    if parts.path.endswith('.m3u8'):
+        return 'playlist'
+    if parts.hostname == 'video.twimg.com':
+        return 'gif' if parts.path.startswith('/tweet_video/') else 'video'
+    if parts.hostname == 'pbs.twimg.com':
+        return 'image'
+    return default
+
+
+def current_time():
+    return datetime.now(timezone.utc).isoformat(timespec = 'seconds')
+
+
+class MediaRef():
+    """
+        推文中的一個媒體
+        kind : 'image' / 'gif' / 'video' (可直接下載的 mp4) / 'playlist' (.m3u8，需由 TwitterVideoDownloader 下載)
+    """
+    __slots__ = ('url', 'kind')
+
+    def __init__(self, url, kind):
+        self.url = url
+        self.kind = kind
+
+    @classmethod
+    def from_url(cls, url, media_type):
+        """kind 由網址判斷，無法判斷時使用推文的 media_type"""
+        return cls(url, classify_media_url(url, media_type))
+
+    def __eq__(self, other):
+        return isinstance(other, MediaRef) and self.url == other.url and self.kind == other.kind
+
+    def __hash__(self):
+        return hash((self.url, self.kind))
+
+    def __repr__(self):
+        return f"MediaRef({self.url!r}, {self.kind!r})"
+
+
+class TweetRecord():
+    """
+        一則推文的資料 (取代原本的 content_dict)
+
+        - 以 __slots__ 儲存，不為每則推文建立 dict，username / status 在建立時解析一次
+        - 媒體網址以 tuple 保存，media 需要時才建立 MediaRef (每個媒體的 kind 由其網址判斷)，media_links 回傳網址的 list
+        - media_type 為第一個媒體的類型 (推文網址 /photo/、/video/ 與 print 使用)
+        - 保留 content_dict 的讀取方式 (record['status']、record.get('url')、dict(record))，既有的呼叫端不需修改
+        - encode() / decode() : 以欄位順序的 JSON 陣列序列化，用於推文清單檔案與跨程序的佇列 (pickle 也使用相同的格式)
+    """
+    __slots__ = ('url', 'status', 'username', 'tweet_time', 'tweet_text', '_media_urls', 'media_type',
+                 'reply', 'retweet', 'like', 'bookmark', 'view', 'created_time')
+
+    def __init__(self, url, status, username, tweet_time, tweet_text = '', media = (), media_type = 'image',
+                 reply = 0, retweet = 0, like = 0, bookmark = 0, view = 0, created_time = None):
+        self.url = url
+        self.status = status
+        self.username = username
+        self.tweet_time = tweet_time
+        self.tweet_text = tweet_text
+        # media 可為 MediaRef 或網址
+        media = tuple(media)
+        if any(isinstance(item, MediaRef) for item in media):
+            media = tuple(item.url if isinstance(item, MediaRef) else item for item in media)
+        self._media_urls = media
+        self.media_type = media_type
+        self.reply = reply
+        self.retweet = retweet
+        self.like = like
+        self.bookmark = bookmark
+        self.view = view
+        self.created_time = created_time or current_time()
+
+    @classmethod
+    def from_url(cls, tweet_url, tweet_time, tweet_text, media_links, media_type, engagement = None, created_time = None):
+        """由推文網址建立 (username / status 由網址解析)，engagement 為 parse_engagement() 的結果"""
+        username, status = parse_tweet_url(tweet_url)
+        engagement = engagement or {}
+        return cls(tweet_url, status, username, tweet_time, tweet_text, media_links, media_type,
+                   *(engagement.get(key, 0) for key in ENGAGEMENT_KEYS), created_time)
+
+    @classmethod
+    def from_row(cls, row):
+        """TWEET_COLUMNS 順序的欄位值 (media_links 為網址的 list)"""
+        url, status, username, tweet_time, tweet_text, media_links, media_type, *engagement, created_time = row
+        return cls(url, status, username, tweet_time, tweet_text, media_links or (), media_type, *engagement, created_time)
+
+    @classmethod
+    def from_dict(cls, content_dict):
+        """由 content_dict 建立 (media_links 可為 list 或以 ", " 分隔的字串)"""
+        media_links = content_dict.get('media_links')
+        if isinstance(media_links, str):
+            media_links = media_links.split(', ') if media_links else []
+        elif not isinstance(media_links, (list, tuple)):
+            # 沒有媒體連結 (Excel 讀出的空白欄位為 NaN)
+            media_links = []
+        row = [content_dict.get(column) for column in TWEET_COLUMNS]
+        row[TWEET_COLUMNS.index('media_links')] = media_links
+        return cls.from_row(row)
+
+    @classmethod
+    def coerce(cls, tweet_content):
+        """TweetRecord 直接回傳，content_dict 轉換為 TweetRecord"""
+        if isinstance(tweet_content, cls):
+            return tweet_content
+        return cls.from_dict(tweet_content)
+
+    @property
+    def media(self):
+        return [MediaRef.from_url(url, self.media_type) for url in self._media_urls]
+
+    @property
+    def media_links(self):
+        return list(self._media_urls)
+
+    def _values(self):
+        """建構子的位置參數 (與 TWEET_COLUMNS 相同順序，媒體為網址的 tuple)"""
+        return (self.url, self.status, self.username, self.tweet_time, self.tweet_text, self._media_urls, self.media_type,
+                self.reply, self.retweet, self.like, self.bookmark, self.view, self.created_time)
+
+    def to_row(self, encode_media_links = None):
+        """TWEET_COLUMNS 順序的欄位值，encode_media_links 轉換 media_links (例如 json.dumps、', '.join)"""
+        media_links = self.media_links
+        if encode_media_links is not None:
+            media_links = encode_media_links(media_links)
+        return (self.url, self.status, self.username, self.tweet_time, self.tweet_text, media_links, self.media_type,
+                self.reply, self.retweet, self.like, self.bookmark, self.view, self.created_time)
+
+    def to_dict(self):
+        return dict(zip(TWEET_COLUMNS, self.to_row()))
+
+    def encode(self):
+        """序列化為一行 JSON (bytes，不含換行)"""
+        return json.dumps((CODEC_VERSION, *self._values()), ensure_ascii = False, separators = (',', ':')).encode('utf-8')
+
+    @classmethod
+    def decode(cls, data):
+        values = json.loads(data)
+        if not values or values[0] != CODEC_VERSION:
+            raise ValueError(f"不支援的推文格式版本 : {values[0] if values else None}")
+        return cls(*values[1:])
+
+    # content_dict 相容的讀取方式
+    def __getitem__(self, key):
+        if key == 'media_links':
+            return self.media_links
+        if key not in TWEET_COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default = None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(TWEET_COLUMNS)
+
+    def __contains__(self, key):
+        return key in TWEET_COLUMNS
+
+    def __eq__(self, other):
+        return isinstance(other, TweetRecord) and self.to_row() == other.to_row()
+
+    def __hash__(self):
+        return hash(self.status)
+
+    def __reduce__(self):
+        return (self.__class__, self._values())
+
+    def __repr__(self):
+        return f"TweetRecord({self.url!r}, media_type={self.media_type!r}, media={len(self._media_urls)})"
+
+
+def write_records(records, f):
+    """逐行寫入 encode() 的結果 (f 為二進位模式的檔案)，回傳寫入的推文數"""
+    count = 0
+    for record in records:
+        f.write(TweetRecord.coerce(record).encode() + b'\n')
+        count += 1
+    return count
+
+
+def iter_records(f):
+    """逐行讀取 write_records() 寫入的推文 (略過空行)"""
+    for line in f:
+        if line.strip():
+            yield TweetRecord.decode(line)
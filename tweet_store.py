@@ -0,0 +1,266 @@
+# 標準庫
+import sys
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+# 自定義模組導入
+from metrics import get_metrics
+from tweet_record import TweetRecord, TWEET_COLUMNS, write_records, iter_records
+
+
+EMPTY_TWEET_TIME = "0000-00-00T00:00:00.000Z"
+
+# 逐批讀取 / 寫入的推文數
+STREAM_BATCH_SIZE = 1000
+
+MEDIA_LINKS_INDEX = TWEET_COLUMNS.index('media_links')
+
+
+def encode_media_links(media_links):
+    """SQLite 的 media_links 欄位 : 網址 list 的 JSON"""
+    return json.dumps(media_links, ensure_ascii = False)
+
+
+def iter_batches(iterable, batch_size = STREAM_BATCH_SIZE):
+    """將 iterable 分成最多 batch_size 個的 list 依序產生"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_tweets_to_xlsx(tweet_content_list, tweet_excel_path = Path('tweet.xlsx')):
+    """以 openpyxl 逐列附加 (不建立 DataFrame)，多個媒體連結使用", "分開"""
+    from openpyxl import Workbook, load_workbook
+
+    rows = [TweetRecord.coerce(tweet_content).to_row(', '.join) for tweet_content in tweet_content_list]
+
+    with get_metrics().timer('xlsx_write'):
+        if tweet_excel_path.exists():
+            workbook = load_workbook(tweet_excel_path)
+            worksheet = workbook['Tweets']
+        else:
+            workbook = Workbook()
+            worksheet = workbook.active
+            worksheet.title = 'Tweets'
+            worksheet.append(TWEET_COLUMNS)
+
+        # 從最後一行之後開始寫入 Excel
+        for row in rows:
+            worksheet.append(row)
+        workbook.save(tweet_excel_path)
+    get_metrics().inc('xlsx_rows_total', len(rows))
+
+
+    print(f"\033[92m推文資料已成功寫入 {tweet_excel_path}\033[0m")
+    print('-'*150)
+
+
+class TweetStore():
+    """
+        推文儲存介面
+        append()            : 附加一批推文 (TweetRecord 或 content_dict)
+        latest_tweet_time() : 最近的推文時間 (沒有資料時為 EMPTY_TWEET_TIME)
+        iter_tweets()       : 依推文時間排序產生所有推文 (TweetRecord)
+    """
+    def append(self, tweet_content_list):
+        raise NotImplementedError
+
+    def latest_tweet_time(self):
+        raise NotImplementedError
+
+    def iter_tweets(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def export_xlsx(self, tweet_excel_path):
+        """
+            匯出成 Excel (覆寫既有檔案)
+            以 openpyxl 的 write-only 模式逐列寫入，不需將所有推文載入記憶體
+        """
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only = True)
+        worksheet = workbook.create_sheet('Tweets')
+        worksheet.append(TWEET_COLUMNS)
+        row_count = 0
+        with get_metrics().timer('xlsx_write'):
+            for tweet_content in self.iter_tweets():
+                worksheet.append(TweetRecord.coerce(tweet_content).to_row(', '.join))
+                row_count += 1
+            workbook.save(tweet_excel_path)
+        get_metrics().inc('xlsx_rows_total', row_count)
+
+        print(f"\033[92m推文資料已成功寫入 {tweet_excel_path}\033[0m")
+
+    def import_tweets(self, tweet_iterator, batch_size = STREAM_BATCH_SIZE):
+        """逐批寫入其他來源的推文 (例如另一個 TweetStore 的 iter_tweets())"""
+        for batch in iter_batches(tweet_iterator, batch_size):
+            self.append(batch)
+
+
+class SQLiteTweetStore(TweetStore):
+    """
+        SQLite 儲存 : 每批推文只寫入該批資料，status 為主鍵，tweet_time 建立索引
+        最近的推文時間以 MAX(tweet_time) 透過索引直接取得，不需讀取整個檔案
+    """
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread = False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS tweets (
+                status       TEXT PRIMARY KEY,
+                url          TEXT,
+                username     TEXT,
+                tweet_time   TEXT,
+                tweet_text   TEXT,
+                media_links  TEXT,
+                media_type   TEXT,
+                reply        INTEGER,
+                retweet      INTEGER,
+                "like"       INTEGER,
+                bookmark     INTEGER,
+                view         INTEGER,
+                created_time TEXT
+            )
+        """)
+        # (tweet_time, status) : MAX(tweet_time) 與 iter_tweets() 的分頁皆可直接使用索引
+        self.connection.execute('CREATE INDEX IF NOT EXISTS idx_tweets_tweet_time_status ON tweets (tweet_time, status)')
+        self.connection.commit()
+
+    def append(self, tweet_content_list):
+        rows = [TweetRecord.coerce(tweet_content).to_row(encode_media_links) for tweet_content in tweet_content_list]
+
+        placeholders = ', '.join('?' for _ in TWEET_COLUMNS)
+        columns = ', '.join(f'"{column}"' for column in TWEET_COLUMNS)
+        with self._lock, get_metrics().timer('tweet_store_append', backend = 'sqlite'):
+            self.connection.executemany(f'INSERT OR REPLACE INTO tweets ({columns}) VALUES ({placeholders})', rows)
+            self.connection.commit()
+
+        print(f"\033[92m推文資料已成功寫入 {self.db_path}\033[0m")
+        print('-'*150)
+
+    def latest_tweet_time(self):
+        with self._lock:
+            row = self.connection.execute('SELECT MAX(tweet_time) FROM tweets').fetchone()
+        return row[0] or EMPTY_TWEET_TIME
+
+    def iter_tweets(self, batch_size = STREAM_BATCH_SIZE):
+        """依 tweet_time 索引逐批讀取 (keyset 分頁)，記憶體中最多 batch_size 則推文"""
+        columns = ', '.join(f'"{column}"' for column in TWEET_COLUMNS)
+        last_key = ('', '')
+        while True:
+            with self._lock:
+                rows = self.connection.execute(
+                    f'SELECT {columns} FROM tweets WHERE (tweet_time, status) > (?, ?) ORDER BY tweet_time, status LIMIT ?',
+                    (*last_key, batch_size)).fetchall()
+            if not rows:
+                return
+
+            for row in rows:
+                row = list(row)
+                row[MEDIA_LINKS_INDEX] = json.loads(row[MEDIA_LINKS_INDEX] or '[]')
+                yield TweetRecord.from_row(row)
+            last_key = (rows[-1][TWEET_COLUMNS.index('tweet_time')], rows[-1][TWEET_COLUMNS.index('status')])
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class XlsxTweetStore(TweetStore):
+    """沿用原本的 Excel 檔案 (每次附加都會重新讀寫整個檔案，適合少量資料)，讀取時才載入 pandas"""
+    def __init__(self, tweet_excel_path):
+        self.tweet_excel_path = Path(tweet_excel_path)
+
+    def append(self, tweet_content_list):
+        write_tweets_to_xlsx(tweet_content_list, self.tweet_excel_path)
+
+    def latest_tweet_time(self):
+        if not self.tweet_excel_path.exists():
+            return EMPTY_TWEET_TIME
+        import pandas as pd
+        df = pd.read_excel(self.tweet_excel_path)
+        if df.empty:
+            return EMPTY_TWEET_TIME
+        return df['tweet_time'].max()
+
+    def iter_tweets(self):
+        if not self.tweet_excel_path.exists():
+            return
+        import pandas as pd
+        df = pd.read_excel(self.tweet_excel_path).sort_values(by = 'tweet_time')
+        for tweet_content in df.to_dict('records'):
+            yield TweetRecord.from_dict(tweet_content)
+
+
+class JsonlTweetStore(TweetStore):
+    """
+        推文清單檔案 : 每行一則 TweetRecord.encode()，附加時只寫入該批資料
+        可作為不需瀏覽器的下載清單 ; latest_tweet_time() 與 iter_tweets() 需讀取整個檔案
+    """
+    def __init__(self, jsonl_path):
+        self.jsonl_path = Path(jsonl_path)
+
+    def append(self, tweet_content_list):
+        with get_metrics().timer('tweet_store_append', backend = 'jsonl'), open(self.jsonl_path, 'ab') as f:
+            write_records(tweet_content_list, f)
+
+        print(f"\033[92m推文資料已成功寫入 {self.jsonl_path}\033[0m")
+        print('-'*150)
+
+    def _iter_file(self):
+        if not self.jsonl_path.exists():
+            return
+        with open(self.jsonl_path, 'rb') as f:
+            yield from iter_records(f)
+
+    def latest_tweet_time(self):
+        return max((tweet.tweet_time for tweet in self._iter_file()), default = EMPTY_TWEET_TIME)
+
+    def iter_tweets(self):
+        # 同一則推文重複附加時保留最後一筆 (與 SQLite 的 INSERT OR REPLACE 相同)
+        tweets = {tweet.status: tweet for tweet in self._iter_file()}
+        yield from sorted(tweets.values(), key = lambda tweet: (tweet.tweet_time, tweet.status))
+
+
+def open_tweet_store(tweet_store):
+    """依副檔名開啟推文儲存 (.xlsx 使用 Excel，.jsonl 使用推文清單檔案，其餘使用 SQLite)，已是 TweetStore 時直接回傳"""
+    if isinstance(tweet_store, TweetStore):
+        return tweet_store
+
+    tweet_store = Path(tweet_store)
+    if tweet_store.suffix == '.xlsx':
+        return XlsxTweetStore(tweet_store)
+    if tweet_store.suffix == '.jsonl':
+        return JsonlTweetStore(tweet_store)
+    return SQLiteTweetStore(tweet_store)
+
+
+if __name__ == '__main__':
+    # python tweet_store.py export twi@xxx_tweets.db twi@xxx_tweets.xlsx
+    # python tweet_store.py import twi@xxx_tweets.xlsx twi@xxx_tweets.db
+    # python tweet_store.py import twi@xxx_tweets.db twi@xxx_tweets.jsonl
+    if len(sys.argv) != 4 or sys.argv[1] not in ('export', 'import'):
+        print("用法 : python tweet_store.py export|import <來源> <目的>")
+        sys.exit(1)
+
+    command, source_path, target_path = sys.argv[1:]
+    source_store = open_tweet_store(source_path)
+    if command == 'export':
+        source_store.export_xlsx(target_path)
+    else:
+        target_store = open_tweet_store(target_path)
+        target_store.import_tweets(source_store.iter_tweets())
+        target_store.close()
+    source_store.close()
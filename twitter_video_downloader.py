@@ -1,251 +1,438 @@
 # 標準庫
-import json
 import time
-import re
+import json
 import shutil
+import tempfile
+import hashlib
 import subprocess
-from collections import OrderedDict
+import threading
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import urllib.request
+import urllib.error
+from urllib.parse import urlsplit
 
-# Selenium
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+# 自定義模組導入
+from http_client import get_default_client
+from download_journal import DownloadJournal, file_sha256
+from network_capture import NetworkCapture
+from metrics import get_metrics
+from resource_blocker import ResourceBlocker
+from hls_parser import PlaylistResolver, iter_local_playlist_lines
+from merge_pool import MergeWorkerPool
 
-def create_driver():
-    """
-    初始化瀏覽器設定並返回 Chrome WebDriver (driver)
-    """
-    options = Options()
-    
-    # 基本設定
-    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0')
-    options.add_argument('--headless')
-    options.add_argument('--disable-gpu')
-    options.add_argument('--disable-extensions')
-    options.add_argument('--mute-audio')
-    options.add_argument("--window-size=1920x1080")
-    
-    # 啟用 Network Logging
-    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-    
-    # 隱藏不必要的終端機輸出
-    options.add_argument('--log-level=1')
-    options.add_experimental_option('excludeSwitches', ['enable-automation', 'enable-logging'])
-    
-    return webdriver.Edge(options = options)
-
-def cookie_login(driver, cookie_file):
+
+def bounded_map(executor, func, items, window):
     """
-        使用cookie登入twitter(auth_token)
+        與 executor.map 相同 (依原順序回傳結果)，但同時最多 window 個工作
+        executor.map 會一次排入所有工作，消費端較慢時所有結果都累積在記憶體中
+        提前結束時取消尚未開始的工作
     """
-    driver.get('https://x.com')
-
-    # 載入保存的 cookies
-    with open(cookie_file, 'r') as f:
-        cookies = json.load(f)
-
-    for cookie in cookies:
-        driver.add_cookie(cookie)
-
-    driver.refresh()
-
-    return driver
+    pending = deque()
+    try:
+        for item in items:
+            if len(pending) >= window:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, item))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+class FFmpegError(Exception):
+    """ffmpeg / ffprobe 失敗，或輸出檔案檢查不通過 (returncode 為 None)"""
+    def __init__(self, operation, returncode, stderr = ''):
+        self.operation = operation
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(f"{operation} 失敗 (returncode = {returncode}) : {stderr[-1000:]}")
 
 
 class FFMPEG():
-    def __init__(self) -> None:
-        pass
-
-    def merge_m3u8(self, input_filepath, output_filepath):
+    """
+        ffmpeg 指令 : 非 0 的結束代碼拋出 FFmpegError (含 stderr)，完成後以 ffprobe 檢查輸出檔案
+        verify = True 且找不到 ffprobe 時不檢查
+    """
+    def __init__(self, metrics = None, ffmpeg_path = 'ffmpeg', ffprobe_path = 'ffprobe', verify = True) -> None:
+        self.metrics = metrics or get_metrics()
         # 如果 FFmpeg 不在 PATH 中，指定完整路徑
         # r'C:\Program Files\FFMPEG\bin\ffmpeg.exe'
-        command = [
-            'ffmpeg',
-            '-i', input_filepath,
-            '-c', 'copy',
-            output_filepath
-        ]
-
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.verify = verify and shutil.which(ffprobe_path) is not None
+
+    def _record_returncode(self, operation, returncode):
+        if returncode != 0:
+            self.metrics.inc('ffmpeg_failures_total', operation = operation, returncode = returncode)
+
+    def _run(self, operation, arguments):
+        command = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y'] + [str(argument) for argument in arguments]
+        with self.metrics.timer('ffmpeg', operation = operation):
+            try:
+                subprocess.run(command, stdout = subprocess.DEVNULL, stderr = subprocess.PIPE, check = True)
+            except subprocess.CalledProcessError as e:
+                self._record_returncode(operation, e.returncode)
+                raise FFmpegError(operation, e.returncode, e.stderr.decode('utf-8', errors = 'replace').strip()) from None
+
+    def probe(self, filepath):
+        """ffprobe 讀取檔案，回傳 {'duration': 秒數, 'streams': ['video', 'audio', ...]}"""
+        command = [self.ffprobe_path, '-v', 'error', '-show_entries', 'format=duration:stream=codec_type', '-of', 'json', str(filepath)]
         try:
-            # 執行命令
-            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
+            result = subprocess.run(command, capture_output = True, check = True)
         except subprocess.CalledProcessError as e:
-            print("FFmpeg命令執行失敗")
-            print("錯誤：", e.stderr)
+            self._record_returncode('ffprobe', e.returncode)
+            raise FFmpegError('ffprobe', e.returncode, e.stderr.decode('utf-8', errors = 'replace').strip()) from None
+
+        info = json.loads(result.stdout or b'{}')
+        try:
+            duration = float(info.get('format', {}).get('duration') or 0)
+        except ValueError:
+            duration = 0.0
+        return {'duration': duration, 'streams': [stream.get('codec_type') for stream in info.get('streams', [])]}
+
+    def verify_output(self, filepath, expected_streams = ()):
+        """輸出檔案需有長度大於 0 的串流，且包含 expected_streams ('video' / 'audio')"""
+        if not self.verify:
+            return
+        info = self.probe(filepath)
+        missing = [stream for stream in expected_streams if stream not in info['streams']]
+        if not info['streams'] or info['duration'] <= 0 or missing:
+            self.metrics.inc('ffmpeg_failures_total', operation = 'verify', returncode = 'none')
+            raise FFmpegError('verify', None, f"{filepath} : duration = {info['duration']}, streams = {info['streams']}")
 
+    def merge_m3u8(self, input_filepath, output_filepath):
+        self._run('merge_m3u8', ['-i', input_filepath, '-c', 'copy', output_filepath])
+        self.verify_output(output_filepath)
 
     def merge_video_audio(self, video_filepath, audio_filepath, output_filepath):
-        command = [
-            'ffmpeg',
-            '-i', video_filepath,  # 視訊輸入
-            '-i', audio_filepath,  # 音訊輸入
-            '-c:v', 'copy',        # 複製視訊編碼（不重新編碼）
-            '-c:a', 'aac',         # 使用 AAC 編碼音訊
+        self._run('merge_video_audio', [
+            '-i', video_filepath,       # 視訊輸入
+            '-i', audio_filepath,       # 音訊輸入
+            '-c:v', 'copy',             # 複製視訊編碼（不重新編碼）
+            '-c:a', 'aac',              # 使用 AAC 編碼音訊
             '-strict', 'experimental',  # 允許實驗性的 AAC 編碼器
-            '-y',                  # 覆蓋已存在的輸出文件
             output_filepath
-        ]
-        
-        try:
-            # 執行命令
-            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            
-        except subprocess.CalledProcessError as e:
-            print("FFmpeg 命令執行失敗")
-            print("錯誤：", e.stderr)
+        ])
+        self.verify_output(output_filepath, ('video', 'audio'))
+
+    def mux_streams(self, video_chunks, audio_filepath, output_filepath):
+        """
+            串流模式 : 影像片段依序由 stdin 傳入，音訊直接複製 (不重新編碼)，一次完成合併
+            stderr 寫入暫存檔 (以 PIPE 讀取時 stderr 寫滿會卡住 stdin)
+        """
+        command = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y', '-i', 'pipe:0']
+        if audio_filepath:
+            command += ['-i', str(audio_filepath), '-map', '0:v', '-map', '1:a']
+        command += ['-c', 'copy', str(output_filepath)]
+
+        # 串流模式的耗時包含等待分段下載
+        with tempfile.TemporaryFile() as stderr_file:
+            with self.metrics.timer('ffmpeg', operation = 'mux_streams'):
+                process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+                try:
+                    for chunk in video_chunks:
+                        process.stdin.write(chunk)
+                except BrokenPipeError:
+                    pass
+                except Exception:
+                    process.kill()
+                    raise
+                finally:
+                    process.stdin.close()
+
+                returncode = process.wait()
+
+            self._record_returncode('mux_streams', returncode)
+            if returncode != 0:
+                stderr_file.seek(0)
+                raise FFmpegError('mux_streams', returncode, stderr_file.read().decode('utf-8', errors = 'replace').strip())
+
+        self.verify_output(output_filepath, ('video', 'audio') if audio_filepath else ())
+        return returncode
 
 
 class TwitterVideoDownloader():
-    def __init__(self, driver):
-        self.BASE_URL = 'https://video.twimg.com'
-        self.ffmpeg = FFMPEG()
+    def __init__(self, driver, max_workers = 8, retries = 3, retry_delay = 1, http_client = None, stream_mode = False, journal = None,
+                 metrics = None, block_resources = True, variant_policy = 'best', max_height = None, merge_pool = None):
+        self.metrics = metrics or get_metrics()
+        self.ffmpeg = FFMPEG(self.metrics)
 
         self.driver = driver
+        self.http_client = http_client or get_default_client()
 
+        # 分段檔案同時下載的數量與失敗重試設定
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._print_lock = threading.Lock()
 
-    def extract_urls(self, text):
-        """
-            找出結尾是.mp4或.m4s的URL
-        """
-        # pattern = re.compile(r'https?:\/\/[^\s"]+?\.(?:mp4|m4s)')
-        pattern = re.compile(r'[^\"\s]+(?:mp4|m4s)')
-        
-        urls = pattern.findall(text)
-        return urls
+        # 串流模式 : 分段不寫入暫存資料夾，直接在記憶體中串接後交給 ffmpeg
+        self.stream_mode = stream_mode
 
-    def get_m3u8_format(self, url):
-        """
-            分析m3u8檔案中的網址，返回檔案類型及影片id
-            url = "/ext_tw_video/1815031743948394496/pu/vid/avc1/0/0/1080x1080/F0_cwFh9VRykKpeG.mp4"
-            parts[-2] = 1080x1080
-            parts[2] = 1815031743948394496
-        """
-        
-        if 'aud' in url:
-            format = 'audio'
-        elif 'vid' in url:
-            format = 'video'    
-        else:
-            return None          
-        
-        # 影片大小
-        # size = url.split('/')[-2]
-        video_id = url.split('/')[2]
+        # 已完成影片的下載紀錄，重新執行時跳過
+        self.journal = journal
+
+        # 載入推文頁面時封鎖 .m4s 分段、圖片與字型，只讓播放器請求 .m3u8 (分段另外以 http_client 下載)
+        self.block_resources = block_resources
+
+        # 由主播放清單選擇一個畫質 (variant_policy : best / max_resolution / max_bitrate / min_bitrate)，依 video_id 快取
+        self.playlist_resolver = PlaylistResolver(self.fetch_text, variant_policy, max_height)
+
+        # 暫存資料夾模式的 ffmpeg 合併交給 merge_pool (MergeWorkerPool) 在背景執行，下載端不等待合併完成
+        self.merge_pool = merge_pool
 
-        # return video_id, format, size
-        return video_id, format
 
-    def parse_m3u8_urls(self, url, timeout = 10, poll_frequency = 0.5):
-        self.driver.get(url)
+    def parse_m3u8_urls(self, url, timeout = 10):
+        network_capture = NetworkCapture.for_driver(self.driver)
+        network_capture.reset()
+        if self.block_resources:
+            ResourceBlocker.for_driver(self.driver).enable()
+
+        with self.metrics.timer('page_load', page = 'tweet'):
+            self.driver.get(url)
         # self.driver.refresh()
 
-        m3u8_urls = []
-        start_time = time.time()
+        return network_capture.wait_for_m3u8(timeout = timeout)
 
-        while time.time() - start_time < timeout:
-            # 獲取瀏覽器日誌
-            logs = self.driver.get_log('performance')
+    def _retry(self, func, *args):
+        """
+            執行下載，連線錯誤與 429 / 5xx 時依 retries 次數重試 (403、404 等其他 HTTP 錯誤直接拋出)
+        """
+        for attempt in range(1, self.retries + 1):
+            try:
+                return func(*args)
+            except (urllib.error.URLError, OSError) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code != 429 and e.code < 500:
+                    raise
+                if attempt == self.retries:
+                    raise
+                self.metrics.inc('download_retries_total', error = type(e).__name__)
+                time.sleep(self.retry_delay * attempt)
+
+    def download_segment(self, url, output_filepath, journal = None):
+        """
+            下載單一分段檔案至 output_filepath
+            有 journal 時跳過已完成的分段，寫到一半的檔案以 Range 續傳
+        """
+        if journal and journal.is_complete(url, output_filepath):
+            self.metrics.inc('segments_skipped_total')
+            return output_filepath
 
-            for log in logs:
-                message = json.loads(log['message'])['message']
-                if 'Network.responseReceived' in message['method']:
-                    try:
-                        response_url = message['params']['response']['url']
-                        if response_url.endswith('.m3u8'):
-                            m3u8_urls.append(response_url)
-                    except KeyError:
-                        continue
+        def download_once():
+            hasher = hashlib.sha256()
+            size = self.http_client.download(url, output_filepath, resume = journal is not None, hasher = hasher)
+            return size, hasher.hexdigest()
 
-            if m3u8_urls:
-                return list(OrderedDict.fromkeys(m3u8_urls))
+        with self.metrics.timer('segment_download', mode = 'file'):
+            size, sha256 = self._retry(download_once)
+        self.metrics.inc('segment_bytes_total', size, mode = 'file')
+        if journal:
+            journal.record(url, output_filepath, size, sha256)
 
-            # 等待一段時間後重新尋找
-            time.sleep(poll_frequency)
+        return output_filepath
 
-        return m3u8_urls
-    
+    def fetch_segment(self, url):
+        """
+            下載單一分段檔案，回傳內容 (bytes)
+        """
+        with self.metrics.timer('segment_download', mode = 'stream'):
+            content = self._retry(self.http_client.get, url)
+        self.metrics.inc('segment_bytes_total', len(content), mode = 'stream')
+        return content
 
-    def process_m3u8(self, m3u8_filepath, download_folder):
-        with open(m3u8_filepath, 'r') as f:
-            content = f.read()
+    def process_m3u8(self, playlist, video_id, m3u8_format, download_folder, journal = None):
+        """
+            下載媒體播放清單 (parse_media_playlist() 的結果) 的所有分段，寫入網址改為檔名的 .m3u8，回傳其路徑
+        """
+        segment_urls = self.get_segment_urls(playlist)
 
-        segment_urls = self.extract_urls(content)        
+        def download(url):
+            return self.download_segment(url, download_folder / self.get_segment_filename(url, m3u8_format), journal)
 
-        # 下載分段檔案        
+        # 同時下載分段檔案 (同時最多 max_workers * 2 個工作)，m3u8 內的順序不變，合併時依原順序組合
         # print('-'*150)
-        for i, url in enumerate(segment_urls):
-            complete_url = f"{self.BASE_URL}{url}"
-            filename = str(Path(url).name) # xxx.m4s or xxx.mp4
-            output_filepath = download_folder / filename
-            urllib.request.urlretrieve(complete_url, output_filepath)
-            
-            # 取代m3u8中的url
-            content = content.replace(url, filename)            
-            print(f"{i+1:2d}/{len(segment_urls):2d} : {url}", end='\r')
-
-
-        # 寫入網址更新為檔案名稱的m3u8檔案
-        video_id, m3u8_format = self.get_m3u8_format(segment_urls[0])    
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            for i, (url, _) in enumerate(zip(segment_urls, bounded_map(executor, download, segment_urls, self.max_workers * 2))):
+                with self._print_lock:
+                    print(f"{i+1:2d}/{len(segment_urls):2d} : {url}", end='\r')
+
+        # 逐行將m3u8中的url改為檔案名稱並寫入
         m3u8_filepath = download_folder / f'{video_id}_{m3u8_format}.m3u8'
         with open(m3u8_filepath, 'w') as f:
-            f.write(content)
-        
-        # 合併片段
-        output_filepath = download_folder / f'{video_id}_{m3u8_format}.mp4'
-        self.ffmpeg.merge_m3u8(m3u8_filepath, output_filepath)
+            f.writelines(iter_local_playlist_lines(playlist['content'], lambda uri: self.get_segment_filename(uri, m3u8_format)))
 
-        return video_id
+        return m3u8_filepath
 
+    def get_segment_urls(self, playlist):
+        """初始化分段 (#EXT-X-MAP) + 所有分段的網址"""
+        return ([playlist['init']] if playlist['init'] else []) + playlist['segments']
 
-    def download(self, tweet_url, m3u8_urls = None, folder = None):
+    def get_segment_filename(self, url, m3u8_format):
+        """影像與音訊的分段可能同名 (init.mp4)，檔名加上 format"""
+        return f"{m3u8_format}_{Path(urlsplit(url).path).name}"
+
+    def download_track(self, playlist, video_id, m3u8_format, download_folder, journal = None):
+        """
+            下載單一播放清單 (影像或音訊) 的分段，回傳本機的 .m3u8 (由 merge_downloaded() 合併)
+        """
+        return self.process_m3u8(playlist, video_id, m3u8_format, download_folder, journal)
+
+    def get_output_file(self, tweet_url, folder, index = 0):
+        """同一則推文有多支影片時，第二支起加上編號"""
         tweet_status = Path(tweet_url).name
         tweet_username = tweet_url.split('/')[-3]
-        download_folder = Path(folder) / Path(Path(tweet_url).name) # 1736361975469441511
-        download_folder.mkdir(exist_ok = True)
+        suffix = f"_{index}" if index else ''
+        return Path(folder) / f"twi@{tweet_username}_{tweet_status}{suffix}.mp4"
+
+    def is_downloaded(self, tweet_url, folder):
+        """影片已記錄在 journal 且檔案完整"""
+        return self.journal is not None and self.journal.is_complete(tweet_url, self.get_output_file(tweet_url, folder))
+
+    def record_downloaded(self, tweet_url, folder):
+        if self.journal is None:
+            return
+        output_file = self.get_output_file(tweet_url, folder)
+        if output_file.exists():
+            self.journal.record(tweet_url, output_file, output_file.stat().st_size, file_sha256(output_file))
+
 
-        # 取得.m3u8檔案連結並下載
-        if not m3u8_urls:  
-            m3u8_urls = self.parse_m3u8_urls(tweet_url)  
+    def fetch_text(self, url):
+        """下載播放清單 (.m3u8) 的文字內容"""
+        return self._retry(self.http_client.get, url).decode('utf-8')
 
-        m3u8_filepaths = []
-        for url in m3u8_urls:
-            output_filepath = download_folder / Path(url).name # folder / NYf5OzT2LbATEvbg.m3u8    
-            urllib.request.urlretrieve(url, output_filepath)
-            m3u8_filepaths.append(output_filepath)
+    def write_segments(self, executor, playlist, filepath, stop_event = None):
+        """依序串接播放清單的分段並寫入 filepath (同時最多 max_workers * 2 個分段)，stop_event 設定後停止"""
+        chunks = bounded_map(executor, self.fetch_segment, self.get_segment_urls(playlist), self.max_workers * 2)
+        try:
+            with open(filepath, 'wb') as f:
+                for chunk in chunks:
+                    if stop_event is not None and stop_event.is_set():
+                        return
+                    f.write(chunk)
+        finally:
+            chunks.close()
+
+    def download_streaming(self, tweet_url, m3u8_urls, folder):
+        """
+            串流模式 : fMP4 分段 (init .mp4 + .m4s) 依序串接即為完整的單軌檔案
+            音訊串接寫入單一檔案，影像直接由 pipe 傳給 ffmpeg，不產生暫存分段與中間 mp4
+            音訊在獨立的執行緒中寫入，同時影像分段開始下載 (兩軌共用分段的執行緒池)
+        """
+        for index, (video_id, playlists) in enumerate(self.playlist_resolver.resolve(m3u8_urls).items()):
+            output_file = self.get_output_file(tweet_url, folder, index)
+            audio_filepath = Path(folder) / f'{video_id}_audio.mp4' if playlists['audio'] and playlists['video'] else None
+            stop_event = threading.Event()
+            try:
+                with ThreadPoolExecutor(max_workers = self.max_workers) as executor, \
+                     ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'audio') as audio_executor:
+                    audio_future = None
+                    if audio_filepath:
+                        audio_future = audio_executor.submit(self.write_segments, executor, playlists['audio'], audio_filepath, stop_event)
+
+                    # 已下載但尚未寫入 ffmpeg 的影像分段最多 max_workers * 2 個
+                    main_playlist = playlists['video'] or playlists['audio']
+                    main_chunks = bounded_map(executor, self.fetch_segment, self.get_segment_urls(main_playlist), self.max_workers * 2)
+                    try:
+                        # 取出第一個分段即填滿影像的下載視窗，ffmpeg 啟動前音訊必須完整寫入
+                        first_chunk = next(main_chunks, b'')
+                        if audio_future is not None:
+                            audio_future.result()
+                        self.ffmpeg.mux_streams(itertools.chain((first_chunk,), main_chunks), audio_filepath, output_file)
+                    finally:
+                        # 失敗時不再下載剩餘的音訊分段
+                        stop_event.set()
+                        main_chunks.close()
+            finally:
+                if audio_filepath:
+                    audio_filepath.unlink(missing_ok = True)
+
+        self.record_downloaded(tweet_url, folder)
+        print(f"\n影片下載成功 : {self.get_output_file(tweet_url, folder)}")
+        print('-'*150)
 
-        video_ids = set()
-        for m3u8_filepath in m3u8_filepaths:
-            video_id = self.process_m3u8(m3u8_filepath, download_folder)
-            video_ids.add(video_id)
-            
-        # 合併影片檔和音訊檔
-        for _, video_id in enumerate(list(video_ids)):
-            video_file = download_folder / f'{video_id}_video.mp4'
-            audio_file = download_folder / f'{video_id}_audio.mp4'
+    def download(self, tweet_url, m3u8_urls = None, folder = None):
+        if self.is_downloaded(tweet_url, folder):
+            print(f"影片已下載，跳過 : {tweet_url}")
+            return
+
+        # 取得.m3u8檔案連結
+        # 沒有 driver 時 (下載執行緒、manifest_download) 不開啟推文頁面，由呼叫端記錄為失敗，之後重新提取
+        if not m3u8_urls:
+            if self.driver is None:
+                raise ValueError(f"沒有影片的 .m3u8 網址 : {tweet_url}")
+            m3u8_urls = self.parse_m3u8_urls(tweet_url)
 
-            output_file = f"{folder}/twi@{tweet_username}_{tweet_status}.mp4"
+        if self.stream_mode:
+            with self.metrics.timer('video_download', mode = 'stream'):
+                return self.download_streaming(tweet_url, m3u8_urls, folder)
 
-            self.ffmpeg.merge_video_audio(video_file, audio_file, output_file)            
+        with self.metrics.timer('video_download', mode = 'file'):
+            return self.download_to_folder(tweet_url, m3u8_urls, folder)
 
+    def download_to_folder(self, tweet_url, m3u8_urls, folder):
+        """
+            暫存資料夾模式 : 分段寫入 folder/{status}/，各軌合併為 mp4 後再合併影音，完成後刪除暫存資料夾
+            有 merge_pool 時合併在背景執行並回傳 Future，下載端可立即處理下一支影片
+        """
+        download_folder = Path(folder) / Path(Path(tweet_url).name) # 1736361975469441511
+        download_folder.mkdir(exist_ok = True)
+
+        # 分段下載紀錄放在暫存資料夾內，中斷後重新執行只下載缺少的分段，完成後隨資料夾刪除
+        segment_journal = DownloadJournal(download_folder / '.segments.jsonl') if self.journal else None
+
+        # [(輸出檔案, {format: 本機 .m3u8})]
+        merge_jobs = []
+        for index, (video_id, playlists) in enumerate(self.playlist_resolver.resolve(m3u8_urls).items()):
+            # 選中畫質的影像與音訊同時下載
+            with ThreadPoolExecutor(max_workers = 2) as executor:
+                futures = {m3u8_format: executor.submit(self.download_track, playlist, video_id, m3u8_format, download_folder, segment_journal)
+                           for m3u8_format, playlist in playlists.items() if playlist}
+                merge_jobs.append((self.get_output_file(tweet_url, folder, index),
+                                   {m3u8_format: future.result() for m3u8_format, future in futures.items()}))
+
+        if self.merge_pool is None:
+            return self.merge_downloaded(tweet_url, folder, download_folder, merge_jobs)
+        return self.merge_pool.submit(self.merge_downloaded, tweet_url, folder, download_folder, merge_jobs, description = tweet_url)
+
+    def merge_downloaded(self, tweet_url, folder, download_folder, merge_jobs):
+        """
+            合併已下載的分段 : 各軌 .m3u8 -> mp4，再合併影音 (只有單軌時直接使用)
+            失敗時保留暫存資料夾，重新執行時只需下載缺少的分段
+        """
+        for output_file, track_playlists in merge_jobs:
+            track_files = {}
+            for m3u8_format, m3u8_filepath in track_playlists.items():
+                track_files[m3u8_format] = m3u8_filepath.with_suffix('.mp4')
+                self.ffmpeg.merge_m3u8(m3u8_filepath, track_files[m3u8_format])
+
+            if len(track_files) == 2:
+                self.ffmpeg.merge_video_audio(track_files['video'], track_files['audio'], output_file)
+            else:
+                shutil.move(next(iter(track_files.values())), output_file)
+
+        self.record_downloaded(tweet_url, folder)
         shutil.rmtree(download_folder)
 
-        print(f"\n影片下載成功 : {output_file}")
+        print(f"\n影片下載成功 : {self.get_output_file(tweet_url, folder)}")
         print("刪除所有暫存檔案")
         print('-'*150)
 
 if __name__=="__main__":
     tweet_url = "https://x.com/kchsom/status/1834424928893829181"
 
-    # 初始化瀏覽器
-    driver = create_driver()
-    cookie_file = "twitter_auth_cookies.json"
-    cookie_login(driver, cookie_file)
+    # 已有 .m3u8 網址時不需要瀏覽器 (driver 為 None，不載入 Selenium)
+    # 需要由推文頁面擷取時 :
+    #     from driver_factory import start_driver
+    #     driver = start_driver("twitter_auth_cookies.json", browser = 'edge', headless = True, block_autoplay = False)     # 需要影片自動播放以載入 .m3u8
+    #     m3u8_urls = TwitterVideoDownloader(driver).parse_m3u8_urls(tweet_url)
 
-    twi_downloader = TwitterVideoDownloader(driver)
-    # m3u8_urls = twi_downloader.parse_m3u8_urls(tweet_url)
-    # print(m3u8_urls)
+    # ffmpeg 合併在背景執行 (預設同時 CPU 核心數個)
+    merge_pool = MergeWorkerPool()
+    twi_downloader = TwitterVideoDownloader(None, merge_pool = merge_pool)
     twi_downloader.download(tweet_url, ['https://video.twimg.com/ext_tw_video/1842120532138848256/pu/pl/avc1/720x720/PXOm6yhsljTavjuU.m3u8', 'https://video.twimg.com/ext_tw_video/1842120532138848256/pu/pl/mp4a/128000/JKbMuOXAv2UYZG_R.m3u8'], folder= '1834424928893829181')
 
-    driver.quit()
+    merge_pool.close()
+    print(f"合併 : {merge_pool.stats['completed']}，失敗 : {merge_pool.stats['failed']}")
@@ -0,0 +1,212 @@
+"""
+    多個瀏覽器同時提取多個帳號的推文 (只提取，寫入各帳號的 tweet_store)
+    同時下載媒體請使用 batch_download.py (BatchDownloader 建立在 ExtractionWorkerPool 之上)
+
+    python worker_pool.py accounts.txt --root-folder "../twitter post downloader/" --workers 4
+"""
+# 標準庫
+import time
+import queue
+import argparse
+import threading
+from pathlib import Path
+
+# Selenium 相關導入
+from selenium.common.exceptions import WebDriverException
+
+# 自定義模組導入
+from get_media_click import TwitterMediaLinkExtractor
+from driver_factory import start_driver
+from seen_index import SeenIndex
+from metrics import get_metrics
+
+
+def read_accounts(account_file):
+    """讀取帳號清單 (每行一個媒體頁面網址)，略過空行、# 開頭的註解與重複的網址"""
+    accounts = []
+    seen = set()
+    with open(account_file, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            target_url = line.strip()
+            if not target_url or target_url.startswith('#') or target_url in seen:
+                continue
+            seen.add(target_url)
+            accounts.append(target_url)
+    return accounts
+
+
+class ExtractionJob():
+    def __init__(self, target_url, tweet_store_path, tweet_amount = 99999):
+        self.target_url = target_url
+        self.tweet_store_path = Path(tweet_store_path)
+        self.tweet_amount = tweet_amount
+        self.attempts = 0
+
+    @property
+    def tweet_media_folder(self):
+        return self.tweet_store_path.parent
+
+    @classmethod
+    def for_account(cls, target_url, root_folder, tweet_amount = 99999):
+        """媒體頁面網址 https://x.com/xxx/media -> root_folder/twi@xxx/twi@xxx_tweets.db (與 get_media_click.py 相同的資料夾與檔名)"""
+        username = target_url.rstrip('/').split('/')[-2]
+        tweet_media_folder = Path(root_folder) / f"twi@{username}"
+        tweet_media_folder.mkdir(parents = True, exist_ok = True)
+        return cls(target_url, tweet_media_folder / f'twi@{username}_tweets.db', tweet_amount)
+
+
+class ExtractionWorkerPool():
+    """
+        同時開啟 num_workers 個瀏覽器 (start_driver)，從共用佇列取出帳號並提取推文
+        - profile_root 有值時每個 worker 使用各自的 profile (profile_root/worker-{id})，重新啟動時沿用登入狀態
+        - 每個 worker 兩次工作之間至少間隔 min_interval 秒
+        - driver 當機 (WebDriverException) 時重新啟動瀏覽器，該帳號重新排入佇列，最多 max_attempts 次
+        - 推文逐則寫入各帳號的 tweet_store，self.results 只記錄推文數 (target_url -> 推文數)，記憶體用量不隨帳號大小增加
+        - 各帳號有自己的 tweet_store (twi@{username}_tweets.db)，同一時間只有一個 worker 寫入，不同 worker 不共用同一個儲存
+        - process() 處理一個帳號 (預設只提取)，子類別可覆寫，例如 batch_download.BatchDownloader 同時下載媒體
+    """
+    def __init__(self, cookie_file, num_workers = 2, min_interval = 5, max_attempts = 3, headless = True, extract_mode = 'timeline',
+                 profile_root = None, metrics = None):
+        self.cookie_file = cookie_file
+        self.profile_root = Path(profile_root) if profile_root else None
+        self.num_workers = num_workers
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.headless = headless
+        self.extract_mode = extract_mode
+        self.metrics = metrics or get_metrics()
+
+        self.job_queue = queue.Queue()
+        self.results = {}
+        self.failed_jobs = []
+        self._lock = threading.Lock()
+
+    def _start_driver(self, worker_id):
+        profile_dir = self.profile_root / f'worker-{worker_id}' if self.profile_root else None
+        # 點擊模式需要影片載入 .m3u8
+        return start_driver(self.cookie_file, headless = self.headless, profile_dir = profile_dir,
+                            block_autoplay = self.extract_mode == 'timeline')
+
+    def create_extractor(self, driver):
+        return TwitterMediaLinkExtractor(driver, metrics = self.metrics)
+
+    def iter_tweets(self, driver, job, seen_index):
+        """依 extract_mode 提取帳號的推文 (逐則產生 TweetRecord，同時寫入 job.tweet_store_path)"""
+        extractor = self.create_extractor(driver)
+        if self.extract_mode == 'timeline':
+            return extractor.iter_media_content_from_timeline(job.target_url, tweet_amount = job.tweet_amount, tweet_store = job.tweet_store_path, seen_index = seen_index)
+        return extractor.iter_media_content(job.target_url, tweet_amount = job.tweet_amount, tweet_store = job.tweet_store_path, seen_index = seen_index)
+
+    def process(self, driver, job):
+        """處理一個帳號，回傳推文數"""
+        seen_index = SeenIndex(job.tweet_media_folder / '.seen_index.db')
+        try:
+            # 只提取不下載 : 產生的推文即使提前結束也會寫入 tweet_store，直接記錄於 seen_index
+            tweet_count = 0
+            for tweet in self.iter_tweets(driver, job, seen_index):
+                seen_index.add_status(tweet.status)
+                tweet_count += 1
+            return tweet_count
+        finally:
+            seen_index.close()
+
+    def _worker(self, worker_id):
+        driver = None
+        last_job_time = 0
+        while True:
+            job = self.job_queue.get()
+            if job is None:
+                self.job_queue.task_done()
+                break
+
+            # 每個 worker 的請求間隔
+            wait_time = self.min_interval - (time.time() - last_job_time)
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+            try:
+                if driver is None:
+                    driver = self._start_driver(worker_id)
+
+                tweet_count = self.process(driver, job)
+                with self._lock:
+                    self.results[job.target_url] = tweet_count
+                self.metrics.inc('accounts_total', result = 'ok')
+
+            except WebDriverException as e:
+                print(f"\033[91m[worker {worker_id}] 瀏覽器錯誤，重新啟動 : {job.target_url}\033[0m")
+                print(f"錯誤：{e.msg}")
+                try:
+                    if driver is not None:
+                        driver.quit()
+                except WebDriverException:
+                    pass
+                driver = None
+
+                job.attempts += 1
+                if job.attempts < self.max_attempts:
+                    self.metrics.inc('accounts_total', result = 'retried')
+                    self.job_queue.put(job)
+                else:
+                    self.metrics.inc('accounts_total', result = 'failed')
+                    with self._lock:
+                        self.failed_jobs.append(job)
+
+            except Exception as e:
+                print(f"\033[91m[worker {worker_id}] 無法提取帳號 : {job.target_url}\033[0m")
+                print(f"錯誤：{e}")
+                self.metrics.inc('accounts_total', result = 'failed')
+                with self._lock:
+                    self.failed_jobs.append(job)
+
+            finally:
+                last_job_time = time.time()
+                self.job_queue.task_done()
+
+        if driver is not None:
+            driver.quit()
+
+    def run(self, jobs):
+        for job in jobs:
+            self.job_queue.put(job)
+
+        workers = []
+        for worker_id in range(min(self.num_workers, self.job_queue.qsize())):
+            worker = threading.Thread(target = self._worker, args = (worker_id,), daemon = True)
+            worker.start()
+            workers.append(worker)
+
+        # 所有帳號 (含重新排入的) 完成後通知 worker 結束
+        self.job_queue.join()
+        for _ in workers:
+            self.job_queue.put(None)
+        for worker in workers:
+            worker.join()
+
+        return self.results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '多個瀏覽器同時提取多個帳號的推文 (不下載媒體)')
+    parser.add_argument('account_file', help = '帳號清單，每行一個媒體頁面網址 https://x.com/xxx/media')
+    parser.add_argument('--root-folder', default = '../twitter post downloader/')
+    parser.add_argument('--cookie-file', default = '../twitter_auth_cookies.json')
+    parser.add_argument('--mode', choices = ['timeline', 'click'], default = 'timeline')
+    parser.add_argument('--workers', type = int, default = 4, help = '同時開啟的瀏覽器數')
+    parser.add_argument('--tweet-amount', type = int, default = 99999, help = '每個帳號最多提取的推文數')
+    parser.add_argument('--max-attempts', type = int, default = 3)
+    parser.add_argument('--show', action = 'store_true', help = '顯示瀏覽器視窗')
+    args = parser.parse_args()
+
+    jobs = [ExtractionJob.for_account(target_url, args.root_folder, args.tweet_amount) for target_url in read_accounts(args.account_file)]
+
+    pool = ExtractionWorkerPool(args.cookie_file, num_workers = args.workers, max_attempts = args.max_attempts, headless = not args.show,
+                                extract_mode = args.mode, profile_root = Path(args.root_folder) / '.chrome_profiles')
+    start_time = time.time()
+    results = pool.run(jobs)
+    elapsed = time.time() - start_time
+
+    tweet_count = sum(results.values())
+    print(f"帳號 : {len(results)} / {len(jobs)}，推文 : {tweet_count}，每分鐘 {tweet_count / elapsed * 60:.1f} 則")
+    for job in pool.failed_jobs:
+        print(f"\033[91m[提取失敗] {job.target_url}\033[0m")